@@ -0,0 +1,5 @@
+import sys
+from trunk.batch import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# Headless solver of the stationary heat equation for many heat flux
+# densities stored as .npy files, each one holding a n x n array.
+# Files are solved by a pool of processes, each one keeping its own
+# factorization cache : files of the same size are sent to the workers in
+# chunks, so that a factorization is computed at most once per chunk.
+# Solutions are written to the output directory, with the same file names,
+# as soon as they are computed.
+# Usage, from the root directory : python3 solve.py --help
+
+import argparse
+import collections
+import concurrent.futures
+import glob
+import os
+import sys
+import time
+import numpy as np
+import trunk.heatEquation as hE
+
+def findInputs(patterns):
+    ''' Returns the sorted list of the .npy files given by patterns, each
+    one being a file, a directory whose .npy files are all taken, or a glob
+    pattern'''
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, '*.npy')))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(path for path in glob.glob(pattern) if path.endswith('.npy'))
+    return sorted(paths)
+
+def gridSize(path):
+    ''' Returns the size n of the n x n heat flux of the .npy file path,
+    reading only its header'''
+    shape = np.load(path, mmap_mode='r').shape
+    if len(shape) != 2 or shape[0] != shape[1]:
+        raise ValueError('%s : expected a square heat flux, got shape %s' % (path, shape))
+    return shape[0]
+
+def chunks(paths, chunkSize):
+    ''' Groups paths by grid size, and yields the lists of at most chunkSize
+    paths of the same size. Unreadable paths are yielded alone'''
+    groups = collections.defaultdict(list)
+    for path in paths:
+        try:
+            groups[gridSize(path)].append(path)
+        except (OSError, ValueError):
+            yield [path]
+    for n in sorted(groups):
+        group = groups[n]
+        for start in range(0, len(group), chunkSize):
+            yield group[start:start+chunkSize]
+
+def solveFiles(paths, outputDirectory, h, conductivity, method):
+    ''' Solves the heat equation for the heat fluxes of paths, run by the
+    worker processes. Returns, for each path, its output path and the time
+    spent solving it, or None and the error message'''
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            heatFlux = np.load(path)
+            if heatFlux.ndim != 2 or heatFlux.shape[0] != heatFlux.shape[1]:
+                raise ValueError('expected a square heat flux, got shape %s'
+                                 % (heatFlux.shape,))
+            solution = hE.solveHeatEquation(heatFlux.astype(float), h, conductivity, method)
+            output = os.path.join(outputDirectory, os.path.basename(path))
+            np.save(output, solution)
+            results.append((path, output, time.perf_counter() - start))
+        except Exception as error:
+            results.append((path, None, str(error)))
+    return results
+
+def solveAll(paths, outputDirectory, h, conductivity, method='sparse', nbWorkers=None,
+             chunkSize=16, maxPending=None, log=sys.stdout):
+    ''' Solves the heat equation for all the heat fluxes of paths with a pool
+    of nbWorkers processes (one per CPU by default), writing the solutions to
+    outputDirectory. At most maxPending chunks (twice the number of workers
+    by default) are submitted at a time, so that memory does not grow with
+    the number of files.
+    Returns the number of files solved and the list of the paths which
+    could not be'''
+    os.makedirs(outputDirectory, exist_ok=True)
+    nbWorkers = nbWorkers or os.cpu_count()
+    maxPending = maxPending or 2*nbWorkers
+    solved, failures = 0, []
+    with concurrent.futures.ProcessPoolExecutor(nbWorkers) as executor:
+        pending = set()
+        tasks = chunks(paths, chunkSize)
+        while True:
+            for chunk in tasks:
+                pending.add(executor.submit(solveFiles, chunk, outputDirectory,
+                                            h, conductivity, method))
+                if len(pending) >= maxPending:
+                    break
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                for path, output, result in future.result():
+                    if output is None:
+                        failures.append(path)
+                        print('%s : failed, %s' % (path, result), file=log, flush=True)
+                    else:
+                        solved += 1
+                        print('%s -> %s (%.3f s)' % (path, output, result), file=log, flush=True)
+    return solved, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Solves the stationary heat equation for .npy heat flux densities')
+    parser.add_argument('inputs', nargs='+',
+                        help='.npy files, directories or glob patterns of the heat fluxes')
+    parser.add_argument('-o', '--output', required=True,
+                        help='directory where the solutions are written')
+    parser.add_argument('--h', type=float, default=0.01,
+                        help='distance between 2 consecutive points (default 0.01)')
+    parser.add_argument('--conductivity', type=float, default=0.025,
+                        help='thermal conductivity of the medium (default 0.025, air)')
+    parser.add_argument('--method', choices=hE.methods, default='sparse')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes (default one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=16,
+                        help='number of files of the same size solved per task')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='maximum number of tasks submitted at a time '
+                             '(default twice the number of processes)')
+    args = parser.parse_args(argv)
+
+    paths = findInputs(args.inputs)
+    if not paths:
+        parser.error('no .npy file found')
+    names = collections.Counter(os.path.basename(path) for path in paths)
+    duplicates = [name for name, count in names.items() if count > 1]
+    if duplicates:
+        parser.error('several inputs are named %s' % ', '.join(sorted(duplicates)))
+
+    start = time.perf_counter()
+    solved, failures = solveAll(paths, args.output, args.h, args.conductivity, args.method,
+                                args.workers, args.chunk_size, args.max_pending)
+    print('%d solved, %d failed in %.2f s' % (solved, len(failures), time.perf_counter() - start))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
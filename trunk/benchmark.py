@@ -0,0 +1,176 @@
+# Headless benchmark suite of the matrix assembly, of the factorizations of
+# cholesky.py and of the methods of heatEquation.solveHeatEquation.
+# Results are written as JSON, and can be compared with a previous run to
+# detect performance regressions.
+# Usage, from the root directory : python3 -m trunk.benchmark --help
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import scipy.sparse
+import trunk.cholesky as cholesky
+import trunk.heatEquation as hE
+import trunk.matgen as matgen
+
+# backends of the cholesky module running Python loops, only run on small
+# matrices
+slowBackends = {'oldComplete'}
+
+def assemblyCases(gridSizes):
+    ''' Yields the (name, size, function) benchmark cases of the assembly of
+    the heat equation matrix'''
+    for n in gridSizes:
+        if n <= 40:
+            yield 'assembly/dense', n, lambda n=n: hE.heatEquationMatrix(n)
+        yield 'assembly/sparse', n, lambda n=n: hE.sparseHeatEquationMatrix(n)
+        yield 'assembly/banded', n, lambda n=n: hE.bandedHeatEquationMatrix(n)
+
+def factorizationCases(matrixSizes):
+    ''' Yields the benchmark cases of the factorizations of cholesky.py,
+    on random symmetric positive definite matrices.
+    The files of the out-of-core factorization are written in a temporary
+    directory, removed once the generator is exhausted or closed'''
+    with tempfile.TemporaryDirectory() as directory:
+        for n in matrixSizes:
+            M = matgen.symmetricSparsePositiveDefinite(n, n*(n-1)*9//10)
+            for backend in cholesky.listBackends():
+                if backend in slowBackends and n > 100:
+                    continue
+                yield 'cholesky/' + backend, n, lambda M=M, f=cholesky.getBackend(backend): f(M)
+            if n <= 100:
+                yield 'cholesky/oldIncomplete', n, lambda M=M: cholesky.oldIncompleteCholesky(M)
+            yield 'cholesky/incomplete', n, lambda M=M: cholesky.incompleteCholesky(M)
+            S = scipy.sparse.csr_matrix(M)
+            yield 'cholesky/sparseIncomplete', n, lambda S=S: cholesky.sparseIncompleteCholesky(S)
+            mPath, tPath = os.path.join(directory, 'M.npy'), os.path.join(directory, 'T.npy')
+            np.save(mPath, M)
+            yield ('cholesky/outOfCore', n,
+                   lambda: cholesky.outOfCoreCholesky(mPath, tPath, 64))
+            # the files of a size are removed before the next one is written
+            for path in (mPath, tPath):
+                if os.path.exists(path):
+                    os.remove(path)
+
+def solveCases(gridSizes):
+    ''' Yields the benchmark cases of every method of solveHeatEquation and
+    of the dense method with every backend of the cholesky module,
+    factorizations included, as well as of the solves alone with a cached
+    factorization'''
+    for n in gridSizes:
+        heatFlux = np.random.RandomState(n).randint(0, 10, (n, n)).astype(float)
+        for method in hE.methods:
+            if method == 'dense' and n > 40:
+                continue
+            yield ('solve/' + method, n,
+                   lambda heatFlux=heatFlux, method=method:
+                   hE.solveHeatEquation(heatFlux, 0.01, 0.025, method, cache=None))
+        for backend in cholesky.listBackends():
+            if n > (10 if backend in slowBackends else 20):
+                continue
+            yield ('solve/dense:' + backend, n,
+                   lambda heatFlux=heatFlux, method='dense:' + backend:
+                   hE.solveHeatEquation(heatFlux, 0.01, 0.025, method, cache=None))
+        cache = hE.FactorizationCache()
+        for method in hE.factorizations:
+            if method == 'dense' and n > 40:
+                continue
+            yield ('cachedSolve/' + method, n,
+                   lambda heatFlux=heatFlux, method=method, cache=cache:
+                   hE.solveHeatEquation(heatFlux, 0.01, 0.025, method, cache))
+
+def measure(function, warmup, repeat):
+    ''' Returns the execution times of repeat calls of function, after
+    warmup calls whose times are discarded'''
+    for i in range(warmup):
+        function()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+def runBenchmarks(cases, warmup=1, repeat=5, pattern=None, log=sys.stdout):
+    ''' Runs the benchmark cases whose name contains pattern, and returns
+    their results, indexed by 'name/n=size' '''
+    results = {}
+    for name, size, function in cases:
+        if pattern is not None and pattern not in name:
+            continue
+        key = '%s/n=%d' % (name, size)
+        times = measure(function, warmup, repeat)
+        q1, median, q3 = np.percentile(times, [25, 50, 75])
+        results[key] = {'median': median, 'iqr': q3 - q1, 'times': times}
+        print('%-40s %12.6f s  (iqr %.6f)' % (key, median, q3 - q1), file=log, flush=True)
+    return results
+
+def compare(results, baseline, threshold):
+    ''' Returns the list of (key, ratio) of the results whose median is more
+    than threshold times slower than in baseline, the difference exceeding
+    the dispersion of both measures'''
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        ratio = result['median'] / base['median']
+        noise = result['iqr'] + base['iqr']
+        if ratio > 1 + threshold and result['median'] - base['median'] > noise:
+            regressions.append((key, ratio))
+    return regressions
+
+def metadata():
+    return {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the heat equation solvers')
+    parser.add_argument('--grid-sizes', type=int, nargs='+', default=[10, 20, 40, 80],
+                        help='sizes n of the n x n grids')
+    parser.add_argument('--matrix-sizes', type=int, nargs='+', default=[50, 100, 200],
+                        help='sizes of the matrices given to cholesky.py')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', default=None,
+                        help='only runs the benchmarks whose name contains this string')
+    parser.add_argument('--output', default=None, help='JSON file where results are written')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON file of a previous run to compare the results with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slow down above which a benchmark is a regression')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    np.random.seed(args.seed)
+    cases = [assemblyCases(args.grid_sizes), factorizationCases(args.matrix_sizes),
+             solveCases(args.grid_sizes)]
+    results = {}
+    for group in cases:
+        results.update(runBenchmarks(group, args.warmup, args.repeat, args.filter))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': metadata(), 'results': results}, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for key, ratio in regressions:
+            print('REGRESSION %-40s %.2fx slower' % (key, ratio))
+        if regressions:
+            return 1
+        print('No regression against', args.baseline)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
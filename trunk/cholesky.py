@@ -1,9 +1,16 @@
 # A library for running Cholesky factorization and Cholesky incomplete
 # factorization
 # author : Etienne THIERY
-import trunk.matgen
-from numpy import *
+import trunk.instrumentation as instr
+import heapq
+import math
+import os
+import scipy.linalg
+import scipy.sparse
+from concurrent.futures import ThreadPoolExecutor
+from numpy import array, dot, float64, lib, linalg, load, sqrt, tril, zeros
 
+@instr.instrumented('oldCompleteCholesky')
 def oldCompleteCholesky(M):
     ''' Computes the cholesky factorization of a matrix M, i.e the
     lower triangular matrix T such as M = T . T.transpose
@@ -32,6 +39,7 @@ def oldCompleteCholesky(M):
     
     return T
 
+@instr.instrumented('completeCholesky')
 def completeCholesky(M):
     ''' Computes the cholesky factorization of a matrix M, i.e the
     lower triangular matrix T such as M = T . T.transpose
@@ -45,6 +53,75 @@ def completeCholesky(M):
         
     return T
 
+@instr.instrumented('blockedCholesky')
+def blockedCholesky(M, blockSize=128, nbThreads=None):
+    ''' Computes the same factorization as completeCholesky, working on
+    blockSize x blockSize tiles, in a right-looking way : once a diagonal tile
+    is factorized, the tiles below it are obtained by triangular solves,
+    then all the trailing tiles are updated by matrix products.
+    These tile operations are independent within each step, and run on a
+    pool of nbThreads threads (one per CPU by default), numpy releasing the
+    GIL during matrix products'''
+    n = M.shape[0]
+    T = tril(array(M, dtype=float))
+    blocks = [slice(start, start+blockSize) for start in range(0, n, blockSize)]
+    if nbThreads is None:
+        nbThreads = os.cpu_count() or 1
+
+    def solveTile(i, k):
+        # T[i,k] . T[k,k].transpose = M[i,k]
+        T[i, k] = scipy.linalg.solve_triangular(T[k, k], T[i, k].transpose(),
+                                                lower=True, check_finite=False).transpose()
+
+    def updateTile(i, j, k):
+        if i == j:
+            T[i, i] -= tril(dot(T[i, k], T[i, k].transpose()))
+        else:
+            T[i, j] -= dot(T[i, k], T[j, k].transpose())
+
+    with ThreadPoolExecutor(nbThreads) as pool:
+        for step, k in enumerate(blocks):
+            T[k, k] = completeCholesky(T[k, k])
+            below = blocks[step+1:]
+            list(pool.map(lambda i: solveTile(i, k), below))
+            updates = [pool.submit(updateTile, i, j, k)
+                       for row, i in enumerate(below) for j in below[:row+1]]
+            for update in updates:
+                update.result()
+    return T
+
+@instr.instrumented('outOfCoreCholesky')
+def outOfCoreCholesky(M, T, blockSize=512):
+    ''' Computes the same factorization as completeCholesky for matrices
+    which do not fit in memory. M is a numpy.memmap or the path of a .npy
+    file, and T the path of the .npy file where the factor is written, which
+    is returned as a numpy.memmap.
+    The block columns of T are computed from left to right : each one is read
+    from M, updated with the block columns on its left, which are streamed
+    from T one blockSize x blockSize tile at a time, and then factorized.
+    At most one block column and 2 tiles are held in memory'''
+    if isinstance(M, str):
+        M = load(M, mmap_mode='r')
+    n = M.shape[0]
+    T = lib.format.open_memmap(T, mode='w+', dtype=float64, shape=(n, n))
+    for k in range(0, n, blockSize):
+        K = slice(k, k+blockSize)
+        panel = array(M[k:, K], dtype=float)
+        b = panel.shape[1]
+        for j in range(0, k, blockSize):
+            J = slice(j, j+blockSize)
+            TKJ = array(T[K, J])
+            for i in range(k, n, blockSize):
+                panel[i-k:i-k+blockSize] -= dot(array(T[i:i+blockSize, J]), TKJ.transpose())
+        panel[:b] = blockedCholesky(panel[:b])
+        if panel.shape[0] > b:
+            panel[b:] = scipy.linalg.solve_triangular(panel[:b], panel[b:].transpose(), lower=True,
+                                                      check_finite=False).transpose()
+        T[k:, K] = panel
+        T.flush()
+    return T
+
+@instr.instrumented('oldIncompleteCholesky')
 def oldIncompleteCholesky(M):
     '''Only performs an incomplete cholesky factorization
     which result in only an approximation of the result, but is faster '''
@@ -77,6 +154,7 @@ def oldIncompleteCholesky(M):
     return T
 
 
+@instr.instrumented('incompleteCholesky')
 def incompleteCholesky(M):
     '''Only performs an incomplete cholesky factorization
     which result in only an approximation of the result, but is faster '''
@@ -90,3 +168,145 @@ def incompleteCholesky(M):
             else:
                 T[row,col] = (M[row,col] - dot(T[row,:col], (T[col,:col]).transpose())) / T[col,col]      
     return T
+
+def sparseDot(u, v):
+    ''' Dot product of 2 sparse vectors stored as dictionaries'''
+    if len(u) > len(v):
+        u, v = v, u
+    s = 0
+    for j, x in u.items():
+        if j in v:
+            s += x*v[j]
+    return s
+
+@instr.instrumented('sparseIncompleteCholesky')
+def sparseIncompleteCholesky(M, dropTol=None):
+    ''' Incomplete cholesky factorization of a sparse symmetric positive
+    definite matrix M, given in CSR format, of which only the lower
+    triangular part is read. Returns the lower triangular factor in CSR format.
+    If dropTol is None, performs IC(0) : the factor has the same nonzero
+    pattern as M, like incompleteCholesky.
+    Otherwise performs ICT : fill-in is allowed, but the coefficients of row
+    i smaller than dropTol times the norm of row i of M are dropped.
+    Rows are computed one after the other, each coefficient being the sparse
+    dot product of 2 previous rows, which runs in a time proportional to the
+    number of nonzero coefficients and fill-in'''
+    M = scipy.sparse.tril(M, format='csr')
+    n = M.shape[0]
+    # rows[i] maps column j < i to T[i,j], cols[j] lists the rows i > j
+    # where T[i,j] is not null, and diag[i] is T[i,i]
+    rows = [None]*n
+    cols = [[] for i in range(n)]
+    diag = zeros(n)
+    for i in range(n):
+        start, end = M.indptr[i], M.indptr[i+1]
+        a = dict(zip(M.indices[start:end].tolist(), M.data[start:end].tolist()))
+        aii = a.pop(i, 0)
+        threshold = 0 if dropTol is None else dropTol*sqrt((M.data[start:end]**2).sum())
+        row = {}
+        candidates = list(a)
+        heapq.heapify(candidates)
+        seen = set(candidates)
+        while candidates:
+            k = heapq.heappop(candidates)
+            value = (a.get(k, 0) - sparseDot(row, rows[k]))/diag[k]
+            if dropTol is not None and abs(value) < threshold:
+                continue
+            row[k] = value
+            cols[k].append(i)
+            if dropTol is not None:
+                # fill-in : T[i,l] may not be null for any l > k in column k
+                for l in cols[k]:
+                    if l < i and l not in seen:
+                        seen.add(l)
+                        heapq.heappush(candidates, l)
+        d = aii - sparseDot(row, row)
+        if d <= 0:
+            raise linalg.LinAlgError("incomplete factorization breakdown at row %d" % i)
+        diag[i] = sqrt(d)
+        rows[i] = row
+
+    indptr = zeros(n+1, dtype=int)
+    indices, data = [], []
+    for i in range(n):
+        columns = sorted(rows[i])
+        indices += columns + [i]
+        data += [rows[i][j] for j in columns] + [diag[i]]
+        indptr[i+1] = len(indices)
+    return scipy.sparse.csr_matrix((array(data), array(indices), indptr), shape=(n, n))
+
+def choleskyKernel(M, T):
+    ''' Writes the cholesky factorization of M in T, a n x n matrix of
+    zeros, with scalar loops only, to be compiled by numba'''
+    n = M.shape[0]
+    for col in range(n):
+        s = M[col, col]
+        for k in range(col):
+            s -= T[col, k]*T[col, k]
+        T[col, col] = math.sqrt(s)
+        for row in range(col+1, n):
+            s = M[row, col]
+            for k in range(col):
+                s -= T[row, k]*T[col, k]
+            T[row, col] = s/T[col, col]
+
+# choleskyKernel compiled by numba, False if numba is not installed, None
+# until the first call of compiledCholeskyKernel
+compiledKernel = None
+
+def compiledCholeskyKernel():
+    ''' Returns choleskyKernel compiled by numba, or None when numba is not
+    installed. numba is only imported by the first call, and the kernel
+    compiled by its first call in each process : caching the compiled code
+    would write files next to this module'''
+    global compiledKernel
+    if compiledKernel is None:
+        try:
+            import numba
+            compiledKernel = numba.njit(choleskyKernel)
+        except ImportError:
+            compiledKernel = False
+    return compiledKernel or None
+
+@instr.instrumented('numbaCholesky')
+def numbaCholesky(M):
+    ''' Computes the same factorization as completeCholesky with the loops
+    of choleskyKernel compiled by numba, or with completeCholesky itself
+    when numba is not installed'''
+    kernel = compiledCholeskyKernel()
+    if kernel is None:
+        return completeCholesky(M)
+    T = zeros(M.shape)
+    kernel(array(M, dtype=float64), T)
+    return T
+
+def scipyCholesky(M):
+    ''' Computes the same factorization as completeCholesky with LAPACK,
+    in the precision of M : unlike numpy's, single precision matrices are
+    not converted to double precision'''
+    return scipy.linalg.cholesky(M, lower=True, check_finite=False)
+
+# complete factorizations, by name : functions returning the lower
+# triangular matrix T such as M = T . T.transpose
+backends = {}
+
+def registerBackend(name, function):
+    ''' Makes the factorization function available as backend name'''
+    backends[name] = function
+
+def getBackend(name):
+    ''' Returns the factorization function registered as name'''
+    if name not in backends:
+        raise ValueError("unknown backend '%s'" % name)
+    return backends[name]
+
+def listBackends():
+    ''' Returns the names of the registered backends'''
+    return list(backends)
+
+registerBackend('numpy', linalg.cholesky)
+registerBackend('scipy', scipyCholesky)
+registerBackend('complete', completeCholesky)
+registerBackend('oldComplete', oldCompleteCholesky)
+registerBackend('blocked', blockedCholesky)
+registerBackend('numba', numbaCholesky)
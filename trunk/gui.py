@@ -1,8 +1,10 @@
+import time
 import tkinter as tk
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib
 import matplotlib.cm as cm
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import trunk.heatEquation as hE
 
@@ -54,11 +56,32 @@ class ParameterFrame:
 
 
 
+def renderCells(cells, palette, zoom):
+    ''' Returns the binary PPM image of the grid of integers cells, each cell
+    being a zoom x zoom square of color palette[value], where palette is a
+    k x 3 array of RGB colors. Above 4 pixels per cell, cells are
+    separated by black lines'''
+    rgb = palette[cells].astype(np.uint8)
+    rgb = np.repeat(np.repeat(rgb, zoom, axis=0), zoom, axis=1)
+    if zoom >= 4:
+        rgb[::zoom, :] = 0
+        rgb[:, ::zoom] = 0
+    header = 'P6 %d %d 255\n' % (rgb.shape[1], rgb.shape[0])
+    return header.encode() + rgb.tobytes()
+
+
+
 class InputFrame:
     '''
-    Contains a Canvas where a grid is drawn  
+    Contains a Canvas displaying the input grid as a single image, where
+    each cell is a zoom x zoom square. Clicking on a cell increments its
+    value, and dragging paints the following cells with the same value.
+    The mouse wheel zooms in and out
     '''
 
+    # size of the canvas when the grid is reset, in pixels
+    canvasSize = 400
+
     def __init__(self, main):
         '''
         'main' is the MainFrame in which this ParameterFrame is
@@ -71,15 +94,24 @@ class InputFrame:
 
         self.colormap = ['#000084', '#0000ff', '#006dff', '#00e1fb', '#00e1fb',
                          '#beff39', '#ffd000', '#ff6400', '#da0000', '#800000']
+        self.palette = np.array([[int(color[i:i+2], 16) for i in (1, 3, 5)]
+                                 for color in self.colormap])
 
         # Resizing configuration
         self.frame.columnconfigure(0, weight=1)
         self.frame.rowconfigure(0, weight=1)
 
         # Initializing the canvas
-        self.canvas = tk.Canvas(self.frame, bg='white')
+        self.canvas = tk.Canvas(self.frame, bg='white', highlightthickness=0)
         self.canvas.grid(row=0, column=0)
         self.canvas.bind("<Button-1>", self.clickOnCell)
+        self.canvas.bind("<B1-Motion>", self.dragOnCell)
+        self.canvas.bind("<MouseWheel>", self.zoomOnWheel)
+        self.canvas.bind("<Button-4>", self.zoomOnWheel)
+        self.canvas.bind("<Button-5>", self.zoomOnWheel)
+        self.image = tk.PhotoImage()
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image)
+        self.lastCell = None
         self.drawContent()
 
 
@@ -89,68 +121,126 @@ class InputFrame:
         then draw content'''
 
         size = self.main.size.get()
-        canvasSize = 10 * size
-
-        self.main.input = [[0 for x in range(size)] for y in range(size)]
-
-        # updates canvas dimensions
-        self.canvas.config(width=canvasSize, height=canvasSize)
-        self.canvas.delete('all')
-
-        # draws grid
-        for i in range(size):
-            self.canvas.create_line(0, 10*i, canvasSize, 10*i)        
-            self.canvas.create_line(10*i, 0, 10*i, canvasSize)
-        
-        # fills grid
-        self.rectangles = []
-
-        for row in range(size):
-            self.rectangles.append([])
-            y0 = 10 * row + 1
-            y1 = 10 * (row+1) -1
-            for col in range(size):
-                x0 = 10 * col + 1
-                x1 = 10 * (col+1) - 1
-                c = self.main.input[row][col]
-                color = self.colormap[c]
-                nextColor = self.colormap[(c+1)%len(self.colormap)]
-                rect = self.canvas.create_rectangle(x0, y0, x1, y1, 
-                                                    fill=color,
-                                                    activefill=nextColor)
-                self.rectangles[row].append(rect)
-
+        self.main.input = np.zeros((size, size), dtype=int)
+        self.zoom = max(1, self.canvasSize // size)
+        self.redraw()
+
+    def redraw(self):
+        ''' Resizes the image to the current zoom and draws the whole grid'''
+        size = self.main.input.shape[0]
+        pixels = self.zoom * size
+        self.canvas.config(width=pixels, height=pixels)
+        self.image.blank()
+        self.image.config(width=pixels, height=pixels)
+        self.drawCells(0, size, 0, size)
+
+    def drawCells(self, row0, row1, col0, col1):
+        ''' Draws the cells of rows row0 to row1-1 and columns col0 to col1-1'''
+        data = renderCells(self.main.input[row0:row1, col0:col1], self.palette, self.zoom)
+        self.image.tk.call(self.image.name, 'put', data, '-format', 'ppm',
+                           '-to', col0*self.zoom, row0*self.zoom)
+
+    def cellAt(self, event):
+        ''' Returns the row and column of the cell under the mouse, or None
+        if it is outside of the grid'''
+        row, col = event.y//self.zoom, event.x//self.zoom
+        size = self.main.input.shape[0]
+        if 0 <= row < size and 0 <= col < size:
+            return row, col
+        return None
+
+    def setCells(self, rows, cols, value):
+        ''' Sets the cells (rows[i], cols[i]) to value, and only redraws the
+        rectangle containing them'''
+        self.main.input[rows, cols] = value
+        self.drawCells(min(rows), max(rows)+1, min(cols), max(cols)+1)
 
     def clickOnCell(self, event):
         '''
         Function triggered by a click on the input grid
         Increment the value of corresponding cell and changes its color
         '''
+        cell = self.cellAt(event)
+        if cell is None:
+            self.lastCell = None
+            return
+        row, col = cell
+        self.brush = (self.main.input[row, col]+1) % len(self.colormap)
+        self.lastCell = cell
+        self.setCells([row], [col], self.brush)
+
+    def dragOnCell(self, event):
+        '''
+        Function triggered when the mouse moves with the button pressed
+        Paints the cells between the previous position and the current one
+        with the value of the clicked cell
+        '''
+        cell = self.cellAt(event)
+        if cell is None or self.lastCell is None or cell == self.lastCell:
+            return
+        steps = max(abs(cell[0]-self.lastCell[0]), abs(cell[1]-self.lastCell[1]))
+        rows = np.rint(np.linspace(self.lastCell[0], cell[0], steps+1)).astype(int)
+        cols = np.rint(np.linspace(self.lastCell[1], cell[1], steps+1)).astype(int)
+        self.lastCell = cell
+        self.setCells(rows, cols, self.brush)
+
+    def zoomOnWheel(self, event):
+        '''
+        Function triggered by the mouse wheel
+        Doubles or halves the size of the cells
+        '''
+        if event.num == 5 or event.delta < 0:
+            self.zoom = max(1, self.zoom // 2)
+        else:
+            self.zoom = min(64, self.zoom * 2)
+        self.redraw()
 
-        row = event.y//10 
-        col = event.x//10
 
-        # change color to next one
-        c = self.main.input[row][col]
-        self.main.input[row][col] = (c+1)%len(self.colormap)
-        c = self.main.input[row][col]
 
-        # modify rectangle
-        color = self.colormap[c]
-        nextColor = self.colormap[(c+1)%len(self.colormap)]
-        self.canvas.itemconfig(self.rectangles[row][col], fill=color,
-                               activefill=nextColor)
 
 
+class TemperaturePlot:
+    '''
+    Contains the figure where the temperature map is drawn.
+    The figure, its axes and its image are created once, and each new
+    solution only replaces the data of the image and its color limits
+    '''
+
+    def __init__(self):
+        self.fig = Figure(dpi=100)
+        self.plot = self.fig.add_subplot(111)
+        self.plot.axis('off')
+        self.image = self.plot.imshow(np.zeros((1, 1)), interpolation='bilinear',
+                                      cmap=cm.jet_r)
+        # duration of the last update, in seconds
+        self.updateTime = 0
+
+    def update(self, sol):
+        ''' Displays sol, the figure being redrawn when its canvas is idle'''
+        start = time.perf_counter()
+        self.image.set_data(sol)
+        self.image.set_extent((-0.5, sol.shape[1]-0.5, sol.shape[0]-0.5, -0.5))
+        self.image.set_clim(sol.min(), sol.max())
+        self.fig.canvas.draw_idle()
+        self.updateTime = time.perf_counter() - start
 
 
 
 class SolutionFrame:
     ''' 
     Contains a canvas where is embedded a pyplot obtained
-    by calling heatEquation.solveHeatEquation on the input
+    by calling heatEquation.solveHeatEquation on the input.
+    Solving runs in a worker thread, so that the window stays responsive.
+    Grids larger than progressiveSize are solved coarse to fine, each
+    coarse solution being displayed while the finer ones are computed,
+    unless only a few cells changed
     '''
 
+    # delay between 2 checks of the pending solve, in ms
+    pollingDelay = 20
+    progressiveSize = 64
+    h, airConductivity = 0.01, 0.025
+
     def __init__(self, main):
         '''
         'main' is the MainFrame in which this ParameterFrame is
@@ -164,26 +254,93 @@ class SolutionFrame:
         self.frame.columnconfigure(0, weight=1)
         self.frame.rowconfigure(0, weight=1)
 
+        # Solving in the background, the last request superseding the others
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.requestId = 0
+        self.solver = None
+        # last coarse solution computed by the worker, and last one displayed
+        self.preview = None
+        self.shownPreview = None
+
+        # Figure and canvas, reused by every solution
+        self.temperature = TemperaturePlot()
+        self.canvas = FigureCanvasTkAgg(self.temperature.fig, master=self.frame)
+        self.canvas.get_tk_widget().grid(row=0, column=0, sticky=tk.N+tk.S+tk.E+tk.W)
+
         # displaying solution
         self.updatePlot(main)
         
     
 
     def updatePlot(self, main):
-        size, h, airConductivity = 50, 0.01, 0.025
-
-        # Figure initialization
-        self.fig = plt.figure(dpi=100)
-        self.plot = self.fig.add_subplot(111)
-        self.plot.axis('off')
-        self.sol = hE.solveHeatEquation(np.array(main.input), h, airConductivity).transpose()
-        self.plot.imshow(self.sol, interpolation='bilinear', cmap=cm.jet_r)
-
-        # Canvas initialization
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.frame)
-        self.canvas.show()
-        self.canvas.get_tk_widget().grid(row=0, column=0, sticky=tk.N+tk.S+tk.E+tk.W)
-        self.canvas.draw()
+        ''' Starts solving the current input in the worker thread.
+        A solve which has not started yet is cancelled, and the result of
+        one which is running will be ignored'''
+        if self.pending is not None:
+            self.pending.cancel()
+        self.requestId += 1
+        self.pending = self.executor.submit(self.solve, np.array(main.input), self.requestId)
+        self.frame.config(text='Temperature map (solving...)')
+        self.frame.after(self.pollingDelay, self.pollSolution, self.requestId, self.pending)
+
+    def solve(self, heatFlux, requestId):
+        ''' Runs in the worker thread. When only a few cells changed since
+        the previous solve, the solution is updated incrementally.
+        Otherwise large grids are solved progressively, each coarse solution
+        being stored as the preview of request requestId, until a newer
+        request is made'''
+        solver = self.solver
+        if (solver is not None and solver.heatFlux.shape == heatFlux.shape
+                and np.count_nonzero(heatFlux != solver.heatFlux) <= solver.maxIncremental):
+            # the solver keeps updating its solution, which is thus copied
+            return solver.update(heatFlux).copy()
+
+        if heatFlux.shape[0] > self.progressiveSize:
+            self.solver = None
+            for sol in hE.solveHeatEquationProgressive(heatFlux, self.h, self.airConductivity):
+                if requestId != self.requestId:
+                    return None
+                self.preview = (requestId, sol)
+            # the incremental solver of the next edits computes its Green's
+            # functions with the DST, a factorization of a large grid taking
+            # longer than the progressive solve
+            self.solver = hE.IncrementalSolver(heatFlux, self.h, self.airConductivity,
+                                               method='dst', solution=sol.copy())
+            return sol
+        if solver is None or solver.heatFlux.shape != heatFlux.shape:
+            self.solver = hE.IncrementalSolver(heatFlux, self.h, self.airConductivity)
+        return self.solver.update(heatFlux).copy()
+
+    def pollSolution(self, requestId, future):
+        ''' Called by the Tk main loop until the solve of request requestId
+        is done, to display its solution if no newer request was made, or
+        the error raised by the solve in the title'''
+        if requestId != self.requestId:
+            return
+        if not future.done():
+            preview = self.preview
+            if preview is not None and preview is not self.shownPreview and preview[0] == requestId:
+                self.shownPreview = preview
+                size = preview[1].shape[0]
+                self.frame.config(text='Temperature map (preview %d x %d, solving...)' % (size, size))
+                self.showSolution(preview[1].transpose())
+            self.frame.after(self.pollingDelay, self.pollSolution, requestId, future)
+            return
+        self.pending = None
+        try:
+            sol = future.result()
+        except Exception as error:
+            # the incremental solver may have been left half updated
+            self.solver = None
+            self.frame.config(text='Temperature map (error : %s)' % error)
+            return
+        self.frame.config(text='Temperature map')
+        self.showSolution(sol.transpose())
+
+    def showSolution(self, sol):
+        self.sol = sol
+        self.temperature.update(sol)
         
 
     
@@ -203,8 +360,7 @@ class MainFrame:
         # global variables :
         self.size = tk.IntVar()
         self.size.set(20)
-        self.input = [[0 for x in range(self.size.get())] 
-                       for y in range(self.size.get())]
+        self.input = np.zeros((self.size.get(), self.size.get()), dtype=int)
 
         # Widgets
         self.paramFrame = ParameterFrame(self)
@@ -1,22 +1,63 @@
+import collections
+import concurrent.futures
+import threading
 import numpy as np
 import scipy.linalg as splg
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import matplotlib.figure as fg
+import scipy.fft as sfft
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import trunk.multigrid as mg
+import trunk.cholesky as cholesky
+import trunk.instrumentation as instr
+import trunk.supernodal as supernodal
 
-def heatEquationMatrix(n):
+def heatEquationMatrix(n, dtype=int):
     ''' Returns a tridiagonal n^2*n^2 matrix A to solve the heat equation 
     in a discrete way by solving the linear system Ax = b, where b is a n^2 
     vector such as b[n*x+y] is the heat flux density in the point (x,y)
-    and h is the distance on both axis between 2 consecutive points'''
+    and h is the distance on both axis between 2 consecutive points.
+    The matrix is directly assembled with type dtype, without any other
+    n^2*n^2 array'''
     N = n*n
 
-    A = np.diag([1]*(N-n), -n) + np.diag([1]*(N-n), n)
-    sub = -4*np.eye(n) + np.diag([1]*(n-1), 1) + np.diag([1]*(n-1), -1) 
-    for i in range(0, n):
-        A[i*n:(i+1)*n,i*n:(i+1)*n] = sub[:,:]
+    with instr.stage('assembly', format='dense', n=n, size=N):
+        A = np.zeros((N, N), dtype=dtype)
+        i = np.arange(N)
+        A[i, i] = -4
+        # neighbours on the previous and next lines of the grid
+        A[i[:-n], i[:-n]+n] = 1
+        A[i[:-n]+n, i[:-n]] = 1
+        # neighbours on the same line of the grid
+        j = i[:-1][(i[:-1]+1) % n != 0]
+        A[j, j+1] = 1
+        A[j+1, j] = 1
     return A
 
+def sparseHeatEquationMatrix(n):
+    ''' Returns the same n^2*n^2 matrix as heatEquationMatrix, in CSR format.
+    Only its 5n^2 nonzero coefficients are stored, and it is assembled
+    from Kronecker products, without any Python loop'''
+    with instr.stage('assembly', format='sparse', n=n, size=n*n) as record:
+        I = sp.identity(n, format='csr')
+        D = sp.diags([1., -2., 1.], [-1, 0, 1], shape=(n, n), format='csr')
+        A = (sp.kron(I, D) + sp.kron(D, I)).tocsr()
+        record['nnz'] = A.nnz
+    return A
+
+def bandedHeatEquationMatrix(n):
+    ''' Returns the lower half of the same matrix as heatEquationMatrix, in the
+    (n+1) x n^2 banded storage used by scipy.linalg.cholesky_banded :
+    ab[i, j] = A[j+i, j] for 0 <= i <= n'''
+    N = n*n
+    with instr.stage('assembly', format='banded', n=n, size=N):
+        ab = np.zeros((n+1, N))
+        ab[0, :] = -4
+        ab[1, :N-1] = 1
+        # no coupling between the last point of a line and the first of the next
+        ab[1, n-1::n] = 0
+        ab[n, :N-n] = 1
+    return ab
+
 
 def matToVect(M):
     ''' M shoud be a square matrix of size nxn
@@ -25,23 +66,559 @@ def matToVect(M):
     n = M.shape[0]
     return M.transpose().reshape((n*n,))
 
+def sparseBytes(M):
+    ''' Returns the memory used by the sparse matrix M, in CSR or CSC format'''
+    return M.data.nbytes + M.indices.nbytes + M.indptr.nbytes
+
 def vectToMat(v):
     ''' v shoud be a vector of length nxn
     Returns a matrix containing the values in v, read from top to bottom and then 
     stored from the left hand column to the right hand column, from top to bottom'''
-    n = np.sqrt(v.shape[0])
+    n = int(round(np.sqrt(v.shape[0])))
     return v.reshape((n,n)) 
 
-def solveHeatEquation(heatFlux, h, conductivity):
+class DenseCholesky:
+    ''' Dense Cholesky factorization of -heatEquationMatrix(n), computed by
+    the backend of the cholesky module named backend.
+    Runs in O(n^6) time and O(n^4) memory'''
+
+    dtype = np.float64
+    backend = 'numpy'
+
+    def __init__(self, n, backend=None):
+        if backend is None:
+            backend = self.backend
+        factorize = cholesky.getBackend(backend)
+        # -heatEquationMatrix(n), assembled in the precision of the factor
+        A = heatEquationMatrix(n, self.dtype)
+        np.negative(A, out=A)
+        self.T = factorize(A)
+        self.nbytes = self.T.nbytes
+
+    def solve(self, b):
+        ''' Returns x such as heatEquationMatrix(n) x = b'''
+        y = splg.solve_triangular(self.T, b, lower=True, check_finite=False)
+        return -splg.solve_triangular(self.T.transpose(), y, check_finite=False)
+
+class BandedCholesky:
+    ''' Cholesky factorization of -heatEquationMatrix(n) in banded storage,
+    the bandwidth of the matrix being n.
+    Runs in O(n^4) time and O(n^3) memory'''
+
+    dtype = np.float64
+
+    def __init__(self, n):
+        self.cb = splg.cholesky_banded(-bandedHeatEquationMatrix(n).astype(self.dtype),
+                                       lower=True, check_finite=False)
+        self.nbytes = self.cb.nbytes
+
+    def solve(self, b):
+        ''' Returns x such as heatEquationMatrix(n) x = b'''
+        return -splg.cho_solve_banded((self.cb, True), b, check_finite=False)
+
+class SparseLU:
+    ''' Sparse LU factorization of -heatEquationMatrix(n), with a fill
+    reducing column ordering'''
+
+    def __init__(self, n):
+        self.lu = spla.splu(-sparseHeatEquationMatrix(n).tocsc())
+        self.nbytes = sparseBytes(self.lu.L) + sparseBytes(self.lu.U)
+
+    def solve(self, b):
+        ''' Returns x such as heatEquationMatrix(n) x = b'''
+        return -self.lu.solve(b)
+
+class NestedDissectionCholesky:
+    ''' Supernodal Cholesky factorization of -heatEquationMatrix(n), with a
+    nested dissection ordering of the grid, which reduces the number of
+    nonzero coefficients of the factor to O(n^2 log(n))'''
+
+    def __init__(self, n):
+        supernodes, parents = supernodal.nestedDissection(n)
+        self.factor = supernodal.SupernodalCholesky(-sparseHeatEquationMatrix(n),
+                                                    supernodes, parents)
+        self.nbytes = self.factor.nbytes
+
+    def solve(self, b):
+        ''' Returns x such as heatEquationMatrix(n) x = b'''
+        return -self.factor.solve(b)
+
+class IncompleteCholesky:
+    ''' Incomplete Cholesky factorization IC(0) of -heatEquationMatrix(n),
+    i.e. the lower triangular matrix L with the same nonzero pattern as the
+    lower half of the matrix, such as L . L.transpose approximates it.
+    Used as a preconditioner, solve only returns an approximate solution'''
+
+    def __init__(self, n):
+        self.A = -sparseHeatEquationMatrix(n)
+        # with the 5 point stencil, no product of 2 coefficients of L falls
+        # in its pattern, so IC(0) reduces to a recurrence on the squared
+        # diagonal d of L, seen as a n x n grid :
+        # d[r,c] = 4 - 1/d[r,c-1] - 1/d[r-1,c]
+        # which is computed one anti-diagonal r+c = s at a time
+        d = np.zeros((n, n))
+        for s in range(2*n-1):
+            r = np.arange(max(0, s-n+1), min(s, n-1)+1)
+            c = s - r
+            v = np.full(r.shape[0], 4.)
+            left, up = c > 0, r > 0
+            v[left] -= 1/d[r[left], c[left]-1]
+            v[up] -= 1/d[r[up]-1, c[up]]
+            d[r, c] = v
+        diagonal = np.sqrt(d).ravel()
+        sub = -1/diagonal[:-1]
+        sub[n-1::n] = 0
+        # on a single cell, L is only its diagonal
+        if n > 1:
+            self.setFactor(sp.diags([diagonal, sub, -1/diagonal[:-n]], [0, -1, -n]))
+        else:
+            self.setFactor(sp.diags([diagonal], [0]))
+
+    def setFactor(self, L):
+        self.L = L.tocsc()
+        # a LU factorization of a triangular matrix without pivoting leaves
+        # it unchanged, and gives access to SuperLU's triangular solves
+        self.lu = spla.splu(self.L, permc_spec='NATURAL', diag_pivot_thresh=0,
+                            options=dict(SymmetricMode=True))
+        self.nbytes = 2*sparseBytes(self.L) + sparseBytes(self.A)
+
+    def solve(self, b):
+        ''' Returns x such as L . L.transpose x = b'''
+        return self.lu.solve(self.lu.solve(b), trans='T')
+
+class ThresholdIncompleteCholesky(IncompleteCholesky):
+    ''' Incomplete Cholesky factorization with threshold ICT of
+    -heatEquationMatrix(n), computed by cholesky.sparseIncompleteCholesky.
+    Fill-in makes it more accurate than IC(0), at the expense of memory'''
+
+    dropTol = 1e-3
+
+    def __init__(self, n):
+        self.A = -sparseHeatEquationMatrix(n)
+        self.setFactor(cholesky.sparseIncompleteCholesky(self.A, self.dropTol))
+
+class SingleDenseCholesky(DenseCholesky):
+    ''' DenseCholesky computed in single precision, which halves its memory.
+    Used as a preconditioner, solve returns x such as
+    -heatEquationMatrix(n) x = b, in single precision'''
+
+    dtype = np.float32
+    # numpy factorizes single precision matrices in double precision
+    backend = 'scipy'
+
+    def __init__(self, n):
+        DenseCholesky.__init__(self, n)
+        self.A = -sparseHeatEquationMatrix(n)
+        self.nbytes += sparseBytes(self.A)
+
+    def solve(self, b):
+        return -DenseCholesky.solve(self, np.asarray(b, dtype=self.dtype))
+
+class SingleBandedCholesky(BandedCholesky):
+    ''' BandedCholesky computed in single precision, which halves its memory.
+    Used as a preconditioner, solve returns x such as
+    -heatEquationMatrix(n) x = b, in single precision'''
+
+    dtype = np.float32
+
+    def __init__(self, n):
+        BandedCholesky.__init__(self, n)
+        self.A = -sparseHeatEquationMatrix(n)
+        self.nbytes += sparseBytes(self.A)
+
+    def solve(self, b):
+        return -BandedCholesky.solve(self, np.asarray(b, dtype=self.dtype))
+
+class DSTSolver:
+    ''' Solver of the systems of heatEquationMatrix(n) with the discrete sine
+    transform, which needs no factorization.
+    heatEquationMatrix(n) is diagonalized by the type I DST along both axes,
+    its eigenvalues being l[i] + l[j], where l[i] = 2cos(pi(i+1)/(n+1)) - 2.
+    Runs in O(n^2 log(n)) time and O(n^2) memory'''
+
+    def __init__(self, n):
+        l = 2*np.cos(np.pi*np.arange(1, n+1)/(n+1)) - 2
+        self.eigenvalues = l[:, np.newaxis] + l[np.newaxis, :]
+        self.nbytes = self.eigenvalues.nbytes
+
+    def solveGrid(self, B):
+        ''' Returns vectToMat(x), x being such as heatEquationMatrix(n) x = b
+        and B being vectToMat(b)'''
+        X = sfft.dstn(B, type=1, workers=-1)/self.eigenvalues
+        return sfft.idstn(X, type=1, overwrite_x=True, workers=-1)
+
+    def solve(self, b):
+        ''' Returns x such as heatEquationMatrix(n) x = b'''
+        return self.solveGrid(vectToMat(b)).reshape(b.shape[0])
+
+factorizations = {'sparse': SparseLU, 'banded': BandedCholesky,
+                  'dense': DenseCholesky, 'supernodal': NestedDissectionCholesky}
+
+preconditioners = {'ic0': IncompleteCholesky, 'ict': ThresholdIncompleteCholesky,
+                   'dense32': SingleDenseCholesky, 'banded32': SingleBandedCholesky}
+
+# every method accepted by solveHeatEquation
+methods = list(factorizations) + ['pcg', 'multigrid', 'dst', 'mixed']
+
+def factorize(n, method):
+    ''' Returns the factorization of -heatEquationMatrix(n) computed with
+    method, one of the keys of factorizations or preconditioners, or
+    'dense:backend' for a DenseCholesky computed by backend'''
+    if method in factorizations:
+        constructor = factorizations[method]
+    elif method in preconditioners:
+        constructor = preconditioners[method]
+    elif method.startswith('dense:'):
+        backend = method[len('dense:'):]
+        constructor = lambda n: DenseCholesky(n, backend)
+    else:
+        raise ValueError("unknown method '%s'" % method)
+    with instr.stage('factorization', method=method, n=n, size=n*n) as record:
+        factorization = constructor(n)
+        record['nbytes'] = factorization.nbytes
+    return factorization
+
+class FactorizationCache:
+    ''' Keeps the factorizations of -heatEquationMatrix(n), which only depend
+    on n and on the method used, so that solving again on a grid of the same
+    size only costs the triangular solves.
+    The least recently used factorizations are evicted as soon as their total
+    size exceeds maxBytes, and a factorization larger than maxBytes is
+    returned without being kept.
+    Factorizations are computed outside of the lock, so that other threads
+    are not blocked meanwhile, and threads missing the same entry at the
+    same time wait for a single factorization'''
+
+    def __init__(self, maxBytes=512*2**20):
+        self.maxBytes = maxBytes
+        self.nbytes = 0
+        self.entries = collections.OrderedDict()
+        # futures of the factorizations being computed, by key
+        self.computing = {}
+        self.lock = threading.Lock()
+
+    def get(self, n, method):
+        ''' Returns the factorization of size n computed with method,
+        computing it if it is not cached yet'''
+        key = (n, method)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            future = self.computing.get(key)
+            if future is None:
+                future = self.computing[key] = concurrent.futures.Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+        try:
+            factorization = factorize(n, method)
+        except BaseException as error:
+            with self.lock:
+                del self.computing[key]
+            future.set_exception(error)
+            raise
+        with self.lock:
+            del self.computing[key]
+            if factorization.nbytes <= self.maxBytes:
+                self.entries[key] = factorization
+                self.nbytes += factorization.nbytes
+                self.evict()
+        future.set_result(factorization)
+        return factorization
+
+    def resize(self, maxBytes):
+        ''' Changes the memory budget, evicting entries if needed'''
+        with self.lock:
+            self.maxBytes = maxBytes
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def evict(self):
+        while self.nbytes > self.maxBytes:
+            key, factorization = self.entries.popitem(last=False)
+            self.nbytes -= factorization.nbytes
+
+defaultCache = FactorizationCache()
+
+def getFactorization(n, method, cache):
+    ''' Returns the factorization of size n computed with method, taken from
+    cache, or recomputed if cache is None'''
+    if cache is None:
+        return factorize(n, method)
+    return cache.get(n, method)
+
+def solveHeatEquation(heatFlux, h, conductivity, method='sparse',
+                      cache=defaultCache):
+    ''' Solves the stationary heat equation on a n x n grid, where heatFlux
+    is the n x n heat flux density, h the distance between 2 consecutive
+    points and conductivity the thermal conductivity of the medium.
+    method is the name of the factorization used to solve the system,
+    one of 'sparse' (default), 'banded', 'dense' or 'supernodal', or 'pcg',
+    'multigrid', 'dst' or 'mixed' to use solveHeatEquationPCG,
+    solveHeatEquationMultigrid, solveHeatEquationDST or
+    solveHeatEquationMixed with their default parameters.
+    'dense:backend' factorizes with the backend of the cholesky module named
+    backend, 'dense' being 'dense:numpy'.
+    The factorization is taken from cache, and is recomputed at each call
+    if cache is None.
+    The assembly, factorization and solve stages are reported to the hooks
+    of the instrumentation module, if any'''
+    if method == 'pcg':
+        return solveHeatEquationPCG(heatFlux, h, conductivity, cache=cache)[0]
+    if method == 'multigrid':
+        return solveHeatEquationMultigrid(heatFlux, h, conductivity)[0]
+    if method == 'dst':
+        return solveHeatEquationDST(heatFlux, h, conductivity)
+    if method == 'mixed':
+        return solveHeatEquationMixed(heatFlux, h, conductivity, cache=cache)[0]
     n = heatFlux.shape[0]
-    heatFlux = matToVect(heatFlux)*h*h/conductivity
-    M = heatEquationMatrix(n)
-    T = np.linalg.cholesky(-M)
-    y = splg.solve_triangular(T, heatFlux, lower=True, check_finite=False)
-    x = splg.solve_triangular(-T.transpose(), y, check_finite=False)
+    factorization = getFactorization(n, method, cache)
+    # the solution is linear in h^2/conductivity, which is thus applied
+    # after solving, so that the factorization does not depend on it
+    with instr.stage('solve', method=method, n=n, size=n*n):
+        x = factorization.solve(matToVect(heatFlux))*h*h/conductivity
     return vectToMat(x)
 
+def solveHeatEquationBatch(heatFluxes, h, conductivity, method='sparse',
+                           cache=defaultCache):
+    ''' Solves the stationary heat equation for k heat flux densities at once,
+    heatFluxes being a k x n x n array. h and conductivity are either scalars
+    or vectors of length k, giving a value for each heat flux.
+    The system is factorized once, and all right hand sides are solved
+    in a single call, as a matrix. Returns a k x n x n array'''
+    k, n = heatFluxes.shape[0], heatFluxes.shape[1]
+    factorization = getFactorization(n, method, cache)
+    # column i holds matToVect(heatFluxes[i])
+    b = np.asfortranarray(heatFluxes.transpose(2, 1, 0).reshape((n*n, k)))
+    with instr.stage('solve', method=method, n=n, size=n*n, nbRightHandSides=k):
+        x = factorization.solve(b)
+    scale = np.asarray(h)**2/np.asarray(conductivity)
+    return x.transpose().reshape((k, n, n))*np.reshape(scale, (-1, 1, 1))
+
+class IncrementalSolver:
+    ''' Keeps the solution of the heat equation for a heat flux, and updates
+    it when a few cells of the heat flux change : the problem being linear,
+    changing cell (row, col) by delta adds delta*h^2/conductivity times the
+    Green's function of the cell to the solution, i.e. the solution for a
+    heat flux of 1 in this cell only.
+    Green's functions are computed with the factorization taken from cache,
+    or with DSTSolver if method is 'dst', which needs no factorization, and
+    the most recently used ones are kept until their total size exceeds
+    maxBytes, so that editing again a cell costs O(n^2)'''
+
+    def __init__(self, heatFlux, h, conductivity, method='sparse',
+                 cache=defaultCache, maxBytes=64*2**20, maxIncremental=8,
+                 solution=None):
+        ''' Updates changing more than maxIncremental cells are solved
+        from scratch. solution is the solution for heatFlux, if it is
+        already known'''
+        self.h, self.conductivity = h, conductivity
+        self.maxBytes, self.maxIncremental = maxBytes, maxIncremental
+        self.heatFlux = np.array(heatFlux, dtype=float)
+        if method == 'dst':
+            self.factorization = DSTSolver(self.heatFlux.shape[0])
+        else:
+            self.factorization = getFactorization(self.heatFlux.shape[0], method, cache)
+        self.greens = collections.OrderedDict()
+        if solution is None:
+            self.resolve()
+        else:
+            self.solution = np.array(solution, dtype=float)
+
+    def resolve(self):
+        ''' Solves the system for the current heat flux from scratch'''
+        x = self.factorization.solve(matToVect(self.heatFlux))
+        self.solution = vectToMat(x)*self.h*self.h/self.conductivity
+
+    def green(self, row, col):
+        ''' Returns the Green's function of cell (row, col), as a vector'''
+        key = (row, col)
+        if key in self.greens:
+            self.greens.move_to_end(key)
+            return self.greens[key]
+        n = self.heatFlux.shape[0]
+        e = np.zeros(n*n)
+        # matToVect stores cell (row, col) at index col*n+row
+        e[col*n+row] = 1
+        self.greens[key] = self.factorization.solve(e)
+        while len(self.greens) > 1 and len(self.greens)*n*n*8 > self.maxBytes:
+            self.greens.popitem(last=False)
+        return self.greens[key]
+
+    def setCell(self, row, col, value):
+        ''' Sets cell (row, col) of the heat flux to value, and returns the
+        updated solution'''
+        delta = value - self.heatFlux[row, col]
+        if delta != 0:
+            self.heatFlux[row, col] = value
+            scale = delta*self.h*self.h/self.conductivity
+            self.solution += scale*vectToMat(self.green(row, col))
+        return self.solution
+
+    def update(self, heatFlux):
+        ''' Changes the heat flux, and returns the updated solution'''
+        rows, cols = np.nonzero(heatFlux != self.heatFlux)
+        if len(rows) > self.maxIncremental:
+            self.heatFlux = np.array(heatFlux, dtype=float)
+            self.resolve()
+        else:
+            for row, col in zip(rows, cols):
+                self.setCell(row, col, heatFlux[row, col])
+        return self.solution
+
+def solveHeatEquationPCG(heatFlux, h, conductivity, x0=None, tol=1e-10,
+                         maxiter=None, preconditioner='ic0', cache=defaultCache):
+    ''' Solves the same system as solveHeatEquation with the preconditioned
+    conjugate gradient method, which only needs O(n^2) memory.
+    x0 is an initial guess of the solution, such as a previous solution, and
+    defaults to zero. The iterations stop once the norm of the residual is
+    below tol times the norm of the right hand side, or after maxiter
+    iterations (n^2 by default).
+    preconditioner is the name of the preconditioner taken from cache, or
+    None for the unpreconditioned conjugate gradient.
+    Returns the solution, and the list of the relative residual norms
+    of each iteration, starting with the one of x0'''
+    n = heatFlux.shape[0]
+    if maxiter is None:
+        maxiter = n*n
+    # solves -heatEquationMatrix(n) x = -b, which is positive definite
+    b = -matToVect(heatFlux)*h*h/conductivity
+    if preconditioner is None:
+        A = -sparseHeatEquationMatrix(n)
+        applyPreconditioner = lambda r: r
+    else:
+        M = getFactorization(n, preconditioner, cache)
+        A = M.A
+        applyPreconditioner = M.solve
+
+    normB = np.linalg.norm(b)
+    with instr.stage('pcg', preconditioner=preconditioner, n=n, size=n*n) as record:
+        if normB == 0:
+            record['iterations'], record['residual'] = 0, 0.
+            return np.zeros((n, n)), [0.]
+        # solutions are stored as vectToMat(x)
+        x = np.zeros(n*n) if x0 is None else np.array(x0, dtype=float).ravel()
+        r = b - A.dot(x)
+        history = [np.linalg.norm(r)/normB]
+        z = applyPreconditioner(r)
+        p = z.copy()
+        rz = np.dot(r, z)
+        for iteration in range(maxiter):
+            if history[-1] <= tol:
+                break
+            Ap = A.dot(p)
+            alpha = rz/np.dot(p, Ap)
+            x += alpha*p
+            r -= alpha*Ap
+            history.append(np.linalg.norm(r)/normB)
+            z = applyPreconditioner(r)
+            rzNext = np.dot(r, z)
+            p = z + (rzNext/rz)*p
+            rz = rzNext
+        record['iterations'] = len(history)-1
+        record['residual'] = history[-1]
+    return vectToMat(x), history
+
+def solveHeatEquationMultigrid(heatFlux, h, conductivity, x0=None, tol=1e-10,
+                               maxiter=100):
+    ''' Solves the same system as solveHeatEquation with the matrix-free
+    geometric multigrid solver of the multigrid module, in O(n^2) time and
+    memory. x0, tol and maxiter are used as in solveHeatEquationPCG, maxiter
+    being a number of V-cycles.
+    Returns the solution, and the list of the relative residual norms
+    of each cycle, starting with the one of x0'''
+    # vectToMat(matToVect(heatFlux)) is the transpose of heatFlux
+    b = np.asarray(heatFlux, dtype=float).transpose()*h*h/conductivity
+    n = b.shape[0]
+    with instr.stage('multigrid', n=n, size=n*n) as record:
+        sol, history = mg.solve(b, x0, tol, maxiter)
+        record['iterations'] = len(history)-1
+        record['residual'] = history[-1]
+    return sol, history
+
+def solveHeatEquationProgressive(heatFlux, h, conductivity, coarsestSize=31,
+                                 tol=1e-10, coarseTol=1e-6):
+    ''' Generator of increasingly accurate solutions of the same system as
+    solveHeatEquation : the heat flux is restricted on the grids of the
+    multigrid module, down to the coarsest one larger than coarsestSize,
+    where it is solved first. The solution of each grid is interpolated on
+    the next finer grid, as the initial guess of its multigrid solve.
+    Each solution is yielded as soon as it is computed, on its own grid, the
+    last one being the solution on the n x n grid.
+    Coarse grids are solved up to a relative residual of coarseTol, and the
+    finest one up to tol'''
+    # vectToMat(matToVect(heatFlux)) is the transpose of heatFlux
+    rightHandSides = [np.asarray(heatFlux, dtype=float).transpose()*h*h/conductivity]
+    while mg.coarseSize(rightHandSides[-1].shape[0]) >= coarsestSize:
+        # the coarse grid spacing is twice as large, hence the factor 4
+        rightHandSides.append(4*mg.restrict(rightHandSides[-1]))
+    sol = None
+    for level in range(len(rightHandSides)-1, -1, -1):
+        b = rightHandSides[level]
+        n = b.shape[0]
+        x0 = None if sol is None else mg.prolong(sol, n)
+        with instr.stage('progressive', level=level, n=n, size=n*n) as record:
+            sol, history = mg.solve(b, x0, tol if level == 0 else coarseTol)
+            record['iterations'] = len(history)-1
+        yield sol
+
+def solveHeatEquationDST(heatFlux, h, conductivity):
+    ''' Solves the same system as solveHeatEquation with the discrete sine
+    transform of DSTSolver, without any matrix nor factorization, in
+    O(n^2 log(n)) time'''
+    n = heatFlux.shape[0]
+    # vectToMat(matToVect(heatFlux)) is the transpose of heatFlux
+    b = np.asarray(heatFlux, dtype=float).transpose()*h*h/conductivity
+    with instr.stage('dst', n=n, size=n*n):
+        return DSTSolver(n).solveGrid(b)
+
+def solveHeatEquationMixed(heatFlux, h, conductivity, tol=1e-12, maxiter=20,
+                           preconditioner='banded32', cache=defaultCache):
+    ''' Solves the same system as solveHeatEquation in mixed precision : the
+    system is solved with a single precision factorization taken from cache,
+    'banded32' or 'dense32', whose error is then corrected by iterative
+    refinement, i.e. by solving the system for the residual again, the
+    residual being computed in double precision.
+    Each step reduces the error by a factor around the condition number of
+    the matrix times the single precision machine epsilon. The steps stop
+    once the norm of the residual is below tol times the norm of the right
+    hand side, after maxiter steps, or when the residual stops decreasing.
+    Returns the solution, and the list of the relative residual norms after
+    the first solve and after each refinement step'''
+    n = heatFlux.shape[0]
+    M = getFactorization(n, preconditioner, cache)
+    # solves -heatEquationMatrix(n) x = -b, as solveHeatEquationPCG
+    b = -matToVect(heatFlux)*h*h/conductivity
+    normB = np.linalg.norm(b)
+    with instr.stage('refinement', preconditioner=preconditioner, n=n, size=n*n) as record:
+        if normB == 0:
+            record['iterations'], record['residual'] = 0, 0.
+            return np.zeros((n, n)), [0.]
+        x = M.solve(b).astype(np.float64)
+        r = b - M.A.dot(x)
+        history = [np.linalg.norm(r)/normB]
+        for step in range(maxiter):
+            if history[-1] <= tol or (step > 0 and history[-1] > history[-2]/2):
+                break
+            x += M.solve(r)
+            r = b - M.A.dot(x)
+            history.append(np.linalg.norm(r)/normB)
+        record['iterations'] = len(history)-1
+        record['residual'] = history[-1]
+    return vectToMat(x), history
+
 def printHeatSolution(sol):
+    # matplotlib is only imported when plotting, so that solving does not
+    # depend on it
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm
     plt.imshow(sol.transpose(), interpolation='bilinear', cmap=cm.jet_r)
     plt.colorbar()
     plt.show()
@@ -0,0 +1,141 @@
+# Opt-in instrumentation of the stages of the solvers (assembly,
+# factorization, solves, iterations).
+# Each stage produces a record, a dictionary holding its name, its wall time,
+# the peak of the memory allocated during it when tracemalloc is tracing, and
+# sizes or iteration counts given by the stage itself. Records are passed to
+# the hooks registered with addHook, e.g. a Stats object.
+# When no hook is registered, stages only cost a test and a dictionary.
+
+import contextlib
+import functools
+import threading
+import time
+import tracemalloc
+
+hooks = []
+hooksLock = threading.Lock()
+# the stages being run by each thread, innermost last
+running = threading.local()
+
+def addHook(hook):
+    ''' Registers hook, a function called with the record of each stage'''
+    with hooksLock:
+        hooks.append(hook)
+
+def removeHook(hook):
+    with hooksLock:
+        hooks.remove(hook)
+
+def enabled():
+    return len(hooks) > 0
+
+class Stage:
+    ''' Context manager measuring a stage, whose record is returned by
+    __enter__ so that the stage can add information to it'''
+
+    def __init__(self, name, info):
+        self.record = dict(info, stage=name)
+
+    def __enter__(self):
+        self.memory = tracemalloc.is_tracing()
+        if self.memory:
+            # tracemalloc keeps a single peak : the peak of the enclosing
+            # stage so far is saved before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            stack = running.__dict__.setdefault('stack', [])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start, self.peak = current, current
+            stack.append(self)
+        self.startTime = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exception):
+        self.record['time'] = time.perf_counter() - self.startTime
+        if self.memory:
+            stack = running.stack
+            stack.pop()
+            if tracemalloc.is_tracing():
+                self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+                self.record['peakBytes'] = self.peak - self.start
+                if stack:
+                    stack[-1].peak = max(stack[-1].peak, self.peak)
+        if exception[0] is None:
+            for hook in list(hooks):
+                hook(self.record)
+
+class NullStage:
+    ''' Stage used when instrumentation is disabled'''
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exception):
+        pass
+
+nullStage = NullStage()
+
+def stage(name, **info):
+    ''' Returns a context manager measuring the stage name, info being
+    added to its record'''
+    if not hooks:
+        return nullStage
+    return Stage(name, info)
+
+def instrumented(name):
+    ''' Decorator measuring each call of a function as the stage name, whose
+    first argument is a matrix, of which the size is recorded'''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(M, *args, **kwargs):
+            if not hooks:
+                return function(M, *args, **kwargs)
+            with Stage(name, {'size': getattr(M, 'shape', (None,))[0]}):
+                return function(M, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class Stats:
+    ''' Hook keeping the records of all stages'''
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def select(self, name):
+        ''' Returns the records of the stage name'''
+        return [record for record in self.records if record['stage'] == name]
+
+    def summary(self):
+        ''' Returns, for each stage, its number of calls, its total time and
+        the largest peak of memory allocated during one call'''
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(record['stage'],
+                                       {'calls': 0, 'time': 0., 'peakBytes': 0})
+            entry['calls'] += 1
+            entry['time'] += record['time']
+            entry['peakBytes'] = max(entry['peakBytes'], record.get('peakBytes', 0))
+        return summary
+
+@contextlib.contextmanager
+def collect(memory=True):
+    ''' Context manager collecting the records of the stages run within it in
+    a Stats object. If memory is True, tracemalloc is started during it, which
+    slows down allocations'''
+    stats = Stats()
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    addHook(stats)
+    try:
+        yield stats
+    finally:
+        removeHook(stats)
+        if started:
+            tracemalloc.stop()
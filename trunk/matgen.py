@@ -3,6 +3,7 @@
 # author : Etienne THIERY
 
 from numpy import *
+import scipy.sparse
 
 def symmetricPositiveDefinite(n, maxValue= 1):
     ''' Generates a n x n random symmetric, positive-definite matrix.
@@ -18,7 +19,7 @@ def symmetricPositiveDefinite(n, maxValue= 1):
 
     # We first generate a random matrix
     # with coefficients between -maxValue and +maxValue 
-    A = random.random_integers(-maxValue, maxValue, (n, n))
+    A = random.randint(-maxValue, maxValue+1, (n, n))
 
     # Then by adding to this matrix its transpose, we obtain 
     # a symmetric matrix
@@ -26,50 +27,133 @@ def symmetricPositiveDefinite(n, maxValue= 1):
 
     # Finally we make sure it is strictly diagonnaly dominant by
     # adding 2*n*maxValue times the identity matrix
-    A += 2*n*maxValue*eye(n)
+    A = A + 2*n*maxValue*eye(n)
     return A
 
-def symmetricSparsePositiveDefinite(n, nbZeros, maxValue= 1):
+def symmetricPositiveDefiniteFile(path, n, maxValue= 1, blockSize= 1024):
+    ''' Generates a matrix like symmetricPositiveDefinite directly in the
+    .npy file path, blockSize x blockSize tiles at a time, so that it does
+    not need to fit in memory. Returns it as a numpy.memmap'''
+    M = lib.format.open_memmap(path, mode='w+', dtype=float64, shape=(n, n))
+    for i in range(0, n, blockSize):
+        rows = minimum(blockSize, n-i)
+        for j in range(0, i+1, blockSize):
+            cols = minimum(blockSize, n-j)
+            # tile (i,j) of A + A.transpose
+            tile = (random.randint(-maxValue, maxValue+1, (rows, cols))
+                    + random.randint(-maxValue, maxValue+1, (cols, rows)).transpose())
+            if i == j:
+                tile = tril(tile) + tril(tile, -1).transpose() + 2*n*maxValue*eye(rows)
+            M[i:i+rows, j:j+cols] = tile
+            M[j:j+cols, i:i+rows] = tile.transpose()
+    M.flush()
+    return M
+
+def randomDistinctIntegers(m, k):
+    ''' Returns k distinct random integers between 0 and m-1, drawn in bulk.
+    Runs in O(k log(k)) when k is small compared to m, and O(m) otherwise'''
+    m, k = int(m), int(k)
+    if 2*k > m:
+        mask = ones(m, dtype=bool)
+        mask[randomDistinctIntegers(m, m-k)] = False
+        return flatnonzero(mask)
+    # duplicates are dropped, so twice as many integers as missing are drawn,
+    # and the surplus is then discarded at random
+    if 64*k >= m:
+        mask = zeros(m, dtype=bool)
+        count = 0
+        while count < k:
+            mask[random.randint(m, size=2*(k-count))] = True
+            count = count_nonzero(mask)
+        chosen = flatnonzero(mask)
+    else:
+        chosen = zeros(0, dtype=int64)
+        while chosen.shape[0] < k:
+            drawn = random.randint(m, size=2*(k-chosen.shape[0]))
+            chosen = unique(concatenate((chosen, drawn)))
+    return random.permutation(chosen)[:k]
+
+def upperTriangularIndices(n, t):
+    ''' Returns the rows and columns of the coefficients above the diagonal
+    of a n x n matrix whose indices are t, when they are counted row by row'''
+    # row i starts at index i*n - i*(i+1)/2, which is inverted with floats
+    # then corrected for rounding errors
+    t = asarray(t, dtype=int64)
+    i = floor(((2*n-1) - sqrt((2*n-1)**2 - 8*t.astype(float64)))/2).astype(int64)
+    i[i*n - i*(i+1)//2 > t] -= 1
+    i[(i+1)*n - (i+1)*(i+2)//2 <= t] += 1
+    j = t - (i*n - i*(i+1)//2) + i + 1
+    return i, j
+
+def symmetricSparsePositiveDefinite(n, nbZeros, maxValue= 1, sparse= False):
     ''' Generates a n x n random symmetric, positive-definite matrix.
     with around nbZeros null coefficients (more precisely nbZeros+-1)
     nbZeros must be between 0 and n*(n-1)
     The optionnal maxValue argument can be used to specify a maximum
     absolute value for extradiagonal coefficients.
     Diagonal coefficient will be inferior to 11 times maxValue in
-    absolute value.
+    absolute value. A maxValue below 1 is replaced by 1, extradiagonal
+    coefficients being nonzero integers.
+    If sparse is True, the matrix is returned in CSR format.
 
-    Runs in O(n^2)'''
-    
-    # The algorithm is the same as in symmetricPositiveDefinite
-    # except that the matrix generated in the beginning is 
-    # sparse symmetric
+    Runs in O(n^2), or in O(n + number of nonzero coefficients) if sparse
+    is True'''
 
-    A = zeros((n,n))
-    currentNbZeros = n*(n-1)
-    while currentNbZeros > nbZeros:
-        i, j = random.randint(n, size=2)
-        if i != j and A[i,j] == 0:
-            while A[i,j] == 0:
-                A[i,j] = A[j,i] = random.randint(-maxValue, maxValue+1)
-            currentNbZeros -= 2 
+    # The algorithm is the same as in symmetricPositiveDefinite
+    # except that the matrix generated in the beginning is
+    # sparse symmetric : the positions of its nonzero coefficients
+    # above the diagonal are drawn all at once
+    maxValue = maximum(maxValue, 1)
+    nbPairs = int((n*(n-1) - int(nbZeros) + 1)//2)
+    i, j = upperTriangularIndices(n, randomDistinctIntegers(n*(n-1)//2, nbPairs))
+    values = random.randint(1, maxValue+1, nbPairs) * random.choice([-1, 1], nbPairs)
 
     # Then we make sure it is strictly diagonnaly dominant by
     # adding n*maxValue times the identity matrix
+    if sparse:
+        diagonal = arange(n)
+        rows = concatenate((i, j, diagonal))
+        cols = concatenate((j, i, diagonal))
+        data = concatenate((values, values, full(n, n*maxValue))).astype(float64)
+        return scipy.sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
+    A = zeros((n,n))
+    A[i, j] = values
+    A[j, i] = values
     A += n*maxValue*eye(n)
     return A
-    
+
 def isSymmetric(M):
     ''' Returns true if and only if M is symmetric'''
+    if scipy.sparse.issparse(M):
+        return (M != M.transpose()).nnz == 0
     return array_equal(M, M.transpose())
 
+def isDiagonallyDominant(M):
+    ''' Returns true if and only if each diagonal coefficient of M is greater
+    than the sum of the absolute values of the other coefficients of its row.
+    By the Gershgorin circle theorem, a symmetric matrix with this property
+    is definite positive.
+    Runs in O(number of nonzero coefficients) for sparse matrices'''
+    diagonal = M.diagonal()
+    rowSums = abs(M).sum(axis=1)
+    offDiagonal = asarray(rowSums).ravel() - abs(diagonal)
+    return bool((diagonal > offDiagonal).all())
+
 def isDefinitePositive(M):
     ''' Returns true if and only if M is definite positive'''
-    # using the fact that if all its eigenvalues are positive, 
-    # M is definite positive
-    # be careful, as eigvals use numerical methods, some eigenvalues
-    # which are in reality equal to zero can be found negative
+    # diagonally dominant matrices are definite positive, and otherwise
+    # we use the fact that M is definite positive if and only if its
+    # Cholesky factorization exists, which costs O(n^3/3) but is much
+    # faster than computing eigenvalues
+    # as with eigenvalues, matrices which are only semi-definite positive
+    # may be accepted because of rounding errors : we factorize M + eps*I
+    if isSymmetric(M) and isDiagonallyDominant(M):
+        return True
+    if scipy.sparse.issparse(M):
+        M = M.toarray()
     eps = 1e-5
-    for ev in linalg.eigvals(M):
-        if ev <= 0-eps:
-            return False
+    try:
+        linalg.cholesky(M + eps*eye(M.shape[0]))
+    except linalg.LinAlgError:
+        return False
     return True
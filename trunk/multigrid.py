@@ -0,0 +1,141 @@
+# A matrix-free geometric multigrid solver for the 5 point discrete
+# Laplacian on a n x n grid, with null values on the boundary.
+# Grids are n x n arrays. Internally they are padded with a border of
+# zeros, so that the stencil can be applied with slices only.
+
+import numpy as np
+
+def pad(u):
+    ''' Returns u surrounded with a border of zeros'''
+    U = np.zeros((u.shape[0]+2, u.shape[1]+2))
+    U[1:-1, 1:-1] = u
+    return U
+
+def laplacian(U):
+    ''' Returns the 5 point Laplacian of the padded grid U, on its interior'''
+    return U[:-2, 1:-1] + U[2:, 1:-1] + U[1:-1, :-2] + U[1:-1, 2:] - 4*U[1:-1, 1:-1]
+
+def residual(U, b):
+    ''' Returns b - laplacian(U)'''
+    return b - laplacian(U)
+
+# red points (i+j even), then black points (i+j odd)
+RED_BLACK = ((0, 0), (1, 1), (0, 1), (1, 0))
+BLACK_RED = ((0, 1), (1, 0), (0, 0), (1, 1))
+
+def smooth(U, b, sweeps, order=RED_BLACK):
+    ''' Runs sweeps red-black Gauss-Seidel iterations on laplacian(U) = b,
+    updating the padded grid U in place'''
+    n = b.shape[0]
+    for sweep in range(sweeps):
+        for i, j in order:
+            U[1+i:n+1:2, 1+j:n+1:2] = (U[i:n:2, 1+j:n+1:2] + U[2+i:n+2:2, 1+j:n+1:2]
+                                       + U[1+i:n+1:2, j:n:2] + U[1+i:n+1:2, 2+j:n+2:2]
+                                       - b[i::2, j::2]) / 4
+
+def coarseSize(n):
+    ''' Size of the grid coarser than a n x n grid, whose point i is the
+    point 2i+1 of the fine grid'''
+    return (n-1)//2
+
+def restrict1D(r):
+    ''' Full weighting restriction along the first axis of r, i.e. the
+    transpose of prolong1D divided by 2'''
+    n = r.shape[0]
+    nc = coarseSize(n)
+    rc = r[1:2*nc:2]/2 + (r[0:2*nc-1:2] + r[2:2*nc+1:2])/4
+    if n % 2 == 0:
+        rc[-1] += r[n-1]/6
+    return rc
+
+def prolong1D(ec, n):
+    ''' Linear interpolation along the first axis of ec, to n points'''
+    nc = ec.shape[0]
+    E = np.zeros((nc+2,) + ec.shape[1:])
+    E[1:-1] = ec
+    e = np.zeros((n,) + ec.shape[1:])
+    e[1:2*nc:2] = ec
+    e[0:2*nc+1:2] = (E[:-1] + E[1:])/2
+    if n % 2 == 0:
+        # the last fine point lies between the last coarse point and the
+        # boundary, twice as close to the boundary
+        e[n-1] = ec[nc-1]/3
+    return e
+
+def restrict(r):
+    ''' Full weighting restriction of the n x n grid r on the coarser grid'''
+    return restrict1D(restrict1D(r).transpose()).transpose()
+
+def prolong(ec, n):
+    ''' Bilinear interpolation of the coarse grid ec on a n x n grid'''
+    return prolong1D(prolong1D(ec, n).transpose(), n).transpose()
+
+def directSolve(b):
+    ''' Solves laplacian(u) = b with a dense factorization, for small grids'''
+    n = b.shape[0]
+    D = np.diag([-2.]*n) + np.diag([1.]*(n-1), 1) + np.diag([1.]*(n-1), -1)
+    I = np.eye(n)
+    A = np.kron(I, D) + np.kron(D, I)
+    return np.linalg.solve(A, b.ravel()).reshape((n, n))
+
+def vCycle(U, b, sweeps=2, minSize=3):
+    ''' Runs one V-cycle on laplacian(U) = b, updating the padded grid U
+    in place. Grids smaller than minSize are solved directly.
+    The post-smoothing visits the colors in the reverse order, which makes
+    the cycle a symmetric operator'''
+    n = b.shape[0]
+    if n < minSize:
+        U[1:-1, 1:-1] = directSolve(b)
+        return
+    smooth(U, b, sweeps)
+    # the coarse grid spacing is twice as large, hence the factor 4
+    bc = 4*restrict(residual(U, b))
+    Ec = np.zeros((bc.shape[0]+2, bc.shape[0]+2))
+    vCycle(Ec, bc, sweeps, minSize)
+    U[1:-1, 1:-1] += prolong(Ec[1:-1, 1:-1], n)
+    smooth(U, b, sweeps, BLACK_RED)
+
+def fullMultigrid(b, sweeps=2, minSize=3):
+    ''' Returns an approximation of the solution of laplacian(u) = b, by
+    solving it on the coarser grids first, then running one V-cycle on each
+    finer grid starting from the interpolation of the coarser solution'''
+    n = b.shape[0]
+    if n < minSize:
+        return directSolve(b)
+    uc = fullMultigrid(4*restrict(b), sweeps, minSize)
+    U = pad(prolong(uc, n))
+    vCycle(U, b, sweeps, minSize)
+    return U[1:-1, 1:-1]
+
+def solve(b, x0=None, tol=1e-10, maxiter=100, sweeps=2):
+    ''' Solves laplacian(u) = b on a n x n grid.
+    Starts from x0, or from the full multigrid approximation if x0 is None,
+    then runs V-cycles, accelerated by the conjugate gradient method :
+    when n is not of the form 2^k-1 the grids are not nested, and plain
+    V-cycles converge much slower.
+    Stops when the norm of the residual is below tol times the norm of b,
+    or after maxiter cycles.
+    Returns the solution, and the list of the relative residual norms
+    after each cycle, starting with the one of the initial guess'''
+    normB = np.linalg.norm(b)
+    if normB == 0:
+        return np.zeros(b.shape), [0.]
+    U = pad(fullMultigrid(b, sweeps) if x0 is None else x0)
+    r = residual(U, b)
+    history = [np.linalg.norm(r)/normB]
+    P = np.zeros(U.shape)
+    rz = None
+    for cycle in range(maxiter):
+        if history[-1] <= tol:
+            break
+        Z = np.zeros(U.shape)
+        vCycle(Z, r, sweeps)
+        rzNext = np.vdot(r, Z[1:-1, 1:-1])
+        P = Z if rz is None else Z + (rzNext/rz)*P
+        rz = rzNext
+        LP = laplacian(P)
+        alpha = rz/np.vdot(P[1:-1, 1:-1], LP)
+        U += alpha*P
+        r -= alpha*LP
+        history.append(np.linalg.norm(r)/normB)
+    return U[1:-1, 1:-1].copy(), history
@@ -0,0 +1,137 @@
+# A sparse direct solver for symmetric positive definite matrices, based
+# on a supernodal multifrontal Cholesky factorization, with a nested
+# dissection ordering for the matrices of 5 point stencils on square grids.
+# A supernode is a set of consecutive columns of the factor sharing the
+# same row structure, stored as a dense block.
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.linalg as splg
+
+def nestedDissection(n, leafSize=64):
+    ''' Nested dissection ordering of the points of a n x n grid, point (r,c)
+    having index r*n+c : the grid is recursively split in 2 halves by a
+    line of points, the separator, which is ordered after both halves.
+    Returns the list of supernodes in elimination order, each one being the
+    array of the indices of its points, and the list of their parents in
+    the separator tree. Regions of at most leafSize points are not split,
+    and form a single supernode'''
+    supernodes, parents = [], []
+
+    def dissect(r0, r1, c0, c1):
+        h, w = r1-r0, c1-c0
+        if h*w == 0:
+            return None
+        if h*w <= leafSize or max(h, w) < 3:
+            rows, cols = np.mgrid[r0:r1, c0:c1]
+            children, separator = [], (rows*n + cols).ravel()
+        elif h >= w:
+            m = r0 + h//2
+            children = [dissect(r0, m, c0, c1), dissect(m+1, r1, c0, c1)]
+            separator = m*n + np.arange(c0, c1)
+        else:
+            m = c0 + w//2
+            children = [dissect(r0, r1, c0, m), dissect(r0, r1, m+1, c1)]
+            separator = np.arange(r0, r1)*n + m
+        supernodes.append(separator)
+        parents.append(-1)
+        for child in children:
+            if child is not None:
+                parents[child] = len(supernodes)-1
+        return len(supernodes)-1
+
+    dissect(0, n, 0, n)
+    return supernodes, parents
+
+class SupernodalCholesky:
+    ''' Cholesky factorization of a sparse symmetric positive definite
+    matrix A, given in any scipy.sparse format, with the elimination order
+    given by supernodes, the list of the arrays of the indices of the
+    columns of each supernode, and their assembly tree given by parents.
+    Each supernode must be eliminated after its children, and the row
+    structure of a supernode, its columns excluded, must be included in
+    the columns of its ancestors, which is the case with nestedDissection'''
+
+    def __init__(self, A, supernodes, parents):
+        self.perm = np.concatenate(supernodes)
+        self.bounds = np.cumsum([0] + [len(s) for s in supernodes])
+        self.parents = parents
+        # lower triangular part of the permuted matrix, by columns
+        iperm = np.empty_like(self.perm)
+        iperm[self.perm] = np.arange(len(self.perm))
+        A = sp.coo_matrix(A)
+        rows, cols = iperm[A.row], iperm[A.col]
+        lower = rows >= cols
+        self.A = sp.csc_matrix((A.data[lower], (rows[lower], cols[lower])), shape=A.shape)
+        self.symbolicAnalysis()
+        self.numericFactorization()
+
+    def symbolicAnalysis(self):
+        ''' Computes the row structure of each supernode, i.e. the sorted
+        indices of the nonzero rows of its columns, which starts with its own
+        columns, and the number of nonzero coefficients of the factor'''
+        self.children = [[] for s in self.parents]
+        for s, parent in enumerate(self.parents):
+            if parent != -1:
+                self.children[parent].append(s)
+        self.structures = []
+        self.nnz = 0
+        for s in range(len(self.parents)):
+            first, end = self.bounds[s], self.bounds[s+1]
+            parts = [np.arange(first, end),
+                     self.A.indices[self.A.indptr[first]:self.A.indptr[end]]]
+            for child in self.children[s]:
+                parts.append(self.structures[child][self.bounds[child+1]-self.bounds[child]:])
+            structure = np.unique(np.concatenate(parts))
+            self.structures.append(structure)
+            p = end - first
+            self.nnz += p*len(structure) - p*(p-1)//2
+
+    def numericFactorization(self):
+        ''' Multifrontal factorization : the frontal matrix of each supernode
+        is assembled from the coefficients of A and the update matrices of
+        its children, then its columns are factorized as a dense matrix, and
+        the Schur complement of the remaining rows is passed to its parent'''
+        self.blocks = []
+        self.nbytes = 0
+        updates = {}
+        for s, structure in enumerate(self.structures):
+            first, end = self.bounds[s], self.bounds[s+1]
+            p, m = end-first, len(structure)
+            F = np.zeros((m, m))
+            start, stop = self.A.indptr[first], self.A.indptr[end]
+            rows = np.searchsorted(structure, self.A.indices[start:stop])
+            cols = np.repeat(np.arange(p), np.diff(self.A.indptr[first:end+1]))
+            F[rows, cols] = self.A.data[start:stop]
+            for child in self.children[s]:
+                U, indices = updates.pop(child)
+                positions = np.searchsorted(structure, indices)
+                F[np.ix_(positions, positions)] += U
+            L11 = np.linalg.cholesky(F[:p, :p])
+            L21 = splg.solve_triangular(L11, F[p:, :p].transpose(), lower=True,
+                                        check_finite=False).transpose()
+            if m > p:
+                updates[s] = (F[p:, p:] - np.dot(L21, L21.transpose()), structure[p:])
+            self.blocks.append((L11, L21))
+            self.nbytes += L11.nbytes + L21.nbytes + structure.nbytes
+
+    def solve(self, b):
+        ''' Returns x such as A x = b, b being a vector or a matrix whose
+        columns are right hand sides'''
+        y = np.array(b, dtype=float)[self.perm]
+        for s, (L11, L21) in enumerate(self.blocks):
+            first, end = self.bounds[s], self.bounds[s+1]
+            y[first:end] = splg.solve_triangular(L11, y[first:end], lower=True,
+                                                 check_finite=False)
+            if L21.shape[0] > 0:
+                y[self.structures[s][end-first:]] -= np.dot(L21, y[first:end])
+        for s in range(len(self.blocks)-1, -1, -1):
+            L11, L21 = self.blocks[s]
+            first, end = self.bounds[s], self.bounds[s+1]
+            if L21.shape[0] > 0:
+                y[first:end] -= np.dot(L21.transpose(), y[self.structures[s][end-first:]])
+            y[first:end] = splg.solve_triangular(L11, y[first:end], lower=True, trans='T',
+                                                 check_finite=False)
+        x = np.empty_like(y)
+        x[self.perm] = y
+        return x
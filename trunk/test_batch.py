@@ -0,0 +1,43 @@
+# author : Etienne THIERY
+
+import numpy
+import os, tempfile
+import batch, heatEquation
+
+def test_solveAll():
+    inputs = tempfile.mkdtemp()
+    outputs = os.path.join(tempfile.mkdtemp(), 'solutions')
+    heatFluxes = {}
+    for i in range(7):
+        size = [5, 8, 13][i % 3]
+        heatFluxes['flux%d.npy' % i] = numpy.random.randint(0, 10, (size, size))
+        numpy.save(os.path.join(inputs, 'flux%d.npy' % i), heatFluxes['flux%d.npy' % i])
+    numpy.save(os.path.join(inputs, 'bad.npy'), numpy.zeros((3, 4)))
+    solved, failures = batch.solveAll(batch.findInputs([inputs]), outputs, 0.01, 0.025,
+                                      nbWorkers=2, chunkSize=2, maxPending=2,
+                                      log=open(os.devnull, 'w'))
+    if solved != 7 or failures != [os.path.join(inputs, 'bad.npy')]:
+        return False
+    for name, heatFlux in heatFluxes.items():
+        print(".", end="", flush=True)
+        expected = heatEquation.solveHeatEquation(heatFlux.astype(float), 0.01, 0.025)
+        if not numpy.allclose(numpy.load(os.path.join(outputs, name)), expected):
+            return False
+    return True
+
+def test_chunks():
+    directory = tempfile.mkdtemp()
+    paths = []
+    for i, size in enumerate([4, 6, 4, 4, 6]):
+        paths.append(os.path.join(directory, '%d.npy' % i))
+        numpy.save(paths[-1], numpy.zeros((size, size)))
+    sizes = [[batch.gridSize(path) for path in chunk] for chunk in batch.chunks(paths, 2)]
+    return sizes == [[4, 4], [4], [6, 6]]
+
+def printTest(test_func):
+    print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
+    print(("" if test_func() else "un") + "expected behaviour", flush=True)
+
+if __name__ == "__main__":
+    printTest(test_chunks)
+    printTest(test_solveAll)
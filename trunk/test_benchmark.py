@@ -0,0 +1,61 @@
+# author : Etienne THIERY
+
+import json
+import os, tempfile
+import benchmark
+
+def test_runBenchmarks():
+    cases = [('constant', 1, lambda: None), ('other', 2, lambda: None)]
+    results = benchmark.runBenchmarks(cases, warmup=1, repeat=3, pattern='const',
+                                      log=open(os.devnull, 'w'))
+    if list(results) != ['constant/n=1']:
+        return False
+    result = results['constant/n=1']
+    return len(result['times']) == 3 and result['iqr'] >= 0 and result['median'] >= 0
+
+def test_compare():
+    baseline = {'a': {'median': 1., 'iqr': 0.01}, 'b': {'median': 1., 'iqr': 0.01},
+                'c': {'median': 1., 'iqr': 0.5}}
+    results = {'a': {'median': 1.1, 'iqr': 0.01}, 'b': {'median': 2., 'iqr': 0.01},
+               'c': {'median': 1.4, 'iqr': 0.5}, 'd': {'median': 5., 'iqr': 0.}}
+    # a is within the threshold, c within the noise, and d is new
+    return [key for key, ratio in benchmark.compare(results, baseline, 0.2)] == ['b']
+
+def test_factorizationCases():
+    ''' The temporary files of the out-of-core cases are removed'''
+    parent = tempfile.mkdtemp()
+    tempfile.tempdir = parent
+    try:
+        for name, size, function in benchmark.factorizationCases([20, 30]):
+            if name == 'cholesky/outOfCore':
+                function()
+                directory, = os.listdir(parent)
+                if len(os.listdir(os.path.join(parent, directory))) != 2:
+                    return False
+    finally:
+        tempfile.tempdir = None
+    empty = os.listdir(parent) == []
+    os.rmdir(parent)
+    return empty
+
+def test_main():
+    path = os.path.join(tempfile.mkdtemp(), 'results.json')
+    arguments = ['--grid-sizes', '5', '--matrix-sizes', '10', '--repeat', '1',
+                 '--filter', 'assembly', '--output', path]
+    if benchmark.main(arguments) != 0:
+        return False
+    with open(path) as f:
+        results = json.load(f)['results']
+    if 'assembly/banded/n=5' not in results:
+        return False
+    return benchmark.main(arguments + ['--baseline', path, '--threshold', '1000']) == 0
+
+def printTest(test_func):
+    print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
+    print(("" if test_func() else "un") + "expected behaviour", flush=True)
+
+if __name__ == "__main__":
+    printTest(test_runBenchmarks)
+    printTest(test_compare)
+    printTest(test_factorizationCases)
+    printTest(test_main)
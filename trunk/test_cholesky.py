@@ -1,6 +1,8 @@
 # author : Etienne THIERY
 
 import numpy, random
+import os, tempfile
+import scipy.sparse
 import cholesky, matgen
 import matplotlib.pyplot as plt
 import timeit
@@ -16,6 +18,87 @@ def test_cholesky():
             return False
     return True
 
+def test_blockedCholesky():
+    random.seed()
+    for i in range(10):
+        print(".", end="", flush=True)
+        size = random.randint(100, 200)
+        blockSize = random.randint(1, 64)
+        M = matgen.symmetricPositiveDefinite(size)
+        T = cholesky.blockedCholesky(M, blockSize)
+        if not numpy.allclose(T, cholesky.completeCholesky(M)):
+            return False
+    return True
+
+def test_outOfCoreCholesky():
+    directory = tempfile.mkdtemp()
+    mPath, tPath = os.path.join(directory, "M.npy"), os.path.join(directory, "T.npy")
+    for i in range(5):
+        print(".", end="", flush=True)
+        size = random.randint(100, 200)
+        blockSize = random.randint(1, 64)
+        matgen.symmetricPositiveDefiniteFile(mPath, size, blockSize=blockSize)
+        T = cholesky.outOfCoreCholesky(mPath, tPath, blockSize)
+        if not numpy.allclose(T, cholesky.completeCholesky(numpy.load(mPath))):
+            return False
+    os.remove(mPath)
+    del T
+    os.remove(tPath)
+    os.rmdir(directory)
+    return True
+
+def test_sparseIncompleteCholesky():
+    for i in range(10):
+        print(".", end="", flush=True)
+        size = random.randint(50, 100)
+        nbZeros = random.randint(0, size*(size-1))
+        M = matgen.symmetricSparsePositiveDefinite(size, nbZeros)
+        T = cholesky.sparseIncompleteCholesky(scipy.sparse.csr_matrix(M))
+        if not numpy.allclose(T.toarray(), cholesky.incompleteCholesky(M)):
+            return False
+        # without dropping anything, ICT is the complete factorization
+        T = cholesky.sparseIncompleteCholesky(scipy.sparse.csr_matrix(M), 0)
+        if not numpy.allclose(T.toarray(), cholesky.completeCholesky(M)):
+            return False
+    return True
+
+def test_backends():
+    M = matgen.symmetricPositiveDefinite(60)
+    for name in cholesky.listBackends():
+        print(".", end="", flush=True)
+        if not numpy.allclose(cholesky.getBackend(name)(M), cholesky.completeCholesky(M)):
+            return False
+    # the kernel compiled by numba, run by the interpreter
+    T = numpy.zeros(M.shape)
+    cholesky.choleskyKernel(M, T)
+    if not numpy.allclose(T, cholesky.completeCholesky(M)):
+        return False
+    cholesky.registerBackend('test', cholesky.completeCholesky)
+    registered = cholesky.getBackend('test') is cholesky.completeCholesky
+    del cholesky.backends['test']
+    try:
+        cholesky.getBackend('test')
+    except ValueError:
+        return registered
+    return False
+
+def test_numbaKernel():
+    ''' The kernel compiled by numba, skipped if numba is not installed'''
+    kernel = cholesky.compiledCholeskyKernel()
+    if kernel is None:
+        print("skipped, numba is not installed : ", end="", flush=True)
+        return True
+    for size in [50, 150]:
+        print(".", end="", flush=True)
+        M = matgen.symmetricPositiveDefinite(size).astype(float)
+        T = numpy.zeros(M.shape)
+        kernel(M, T)
+        if not numpy.allclose(T, numpy.linalg.cholesky(M)):
+            return False
+        if not numpy.allclose(cholesky.numbaCholesky(M), numpy.linalg.cholesky(M)):
+            return False
+    return True
+
 def testIncompleteCholeskyPrecision():
     size = 100
     nbOfPoints = 100 
@@ -41,26 +124,31 @@ def compareCompleteVSIncomplete():
     size = 100
     nbOfPoints = 50
     nbValuesForAverage = 4
-    x, yComplete, yIncomplete = [], [], []
+    x, yComplete, yIncomplete, ySparse = [], [], [], []
 
     for i in numpy.linspace(0, size*(size-1), nbOfPoints):
         # Computes matrix density
         x.append((size*size-i)/(size*size))
         # Computes average execution times on 3 calls on different matrix
-        completeTime, incompleteTime = 0, 0
+        completeTime, incompleteTime, sparseTime = 0, 0, 0
         for j in range(nbValuesForAverage):    
             M = matgen.symmetricSparsePositiveDefinite(size, i)
             wrapped1 = wrapper(cholesky.completeCholesky, M)
             completeTime += timeit.timeit(wrapped1, number=1)
             wrapped2 = wrapper(cholesky.incompleteCholesky, M)
             incompleteTime += timeit.timeit(wrapped2, number=1)
+            wrapped3 = wrapper(cholesky.sparseIncompleteCholesky, scipy.sparse.csr_matrix(M))
+            sparseTime += timeit.timeit(wrapped3, number=1)
         yComplete.append(completeTime/nbValuesForAverage)
         yIncomplete.append(incompleteTime/nbValuesForAverage)
+        ySparse.append(sparseTime/nbValuesForAverage)
 
     p1 = plt.plot(x, yComplete, 'b', marker='o')
     p2 = plt.plot(x, yIncomplete, 'g', marker='o')
+    p3 = plt.plot(x, ySparse, 'r', marker='o')
     plt.title("Average execution time for the Cholesky factorization in function of matrix density\n")
-    plt.legend(["New custom Complete factorization", "Custom incomplete factorization"], loc=4)
+    plt.legend(["New custom Complete factorization", "Custom incomplete factorization",
+                "Sparse incomplete factorization"], loc=4)
     plt.ylabel("Execution time (s)")
     plt.xlabel("density of the initial 100*100 matrix")
     plt.show()
@@ -69,27 +157,32 @@ def compareCholeskyCustomVSNumpy():
     maxSize = 500
     nbOfPoints = 200
     nbValuesForAverage = 2
-    x, yCustom, yNumpy = [], [], []
+    x, yCustom, yBlocked, yNumpy = [], [], [], []
 
     for size in [round(i) for i in numpy.linspace(5, maxSize, nbOfPoints)]:
         # Computes matrix density
         x.append(size)
         # Computes average execution times on nbValuesForAverage calls 
         # on different matrix
-        customTime, numpyTime = 0, 0
+        customTime, blockedTime, numpyTime = 0, 0, 0
         for j in range(nbValuesForAverage):
             M = matgen.symmetricPositiveDefinite(size)    
             wrapped1 = wrapper(cholesky.completeCholesky, M)
             customTime += timeit.timeit(wrapped1, number=1)
             wrapped2 = wrapper(numpy.linalg.cholesky, M)
             numpyTime += timeit.timeit(wrapped2, number=1)
+            wrapped3 = wrapper(cholesky.blockedCholesky, M)
+            blockedTime += timeit.timeit(wrapped3, number=1)
         yCustom.append(customTime/nbValuesForAverage)
+        yBlocked.append(blockedTime/nbValuesForAverage)
         yNumpy.append(numpyTime/nbValuesForAverage)
 
     p1 = plt.plot(x, yCustom, 'b', marker='o')
     p2 = plt.plot(x, yNumpy, 'g', marker='o')
+    p3 = plt.plot(x, yBlocked, 'r', marker='o')
     plt.title("Average execution time for the Cholesky factorization (custom and Numpy's) in function of size\n")
-    plt.legend(["New custom Cholesky factorization", "Numpy Cholesky factorization"], loc=2)
+    plt.legend(["New custom Cholesky factorization", "Numpy Cholesky factorization",
+                "Blocked custom Cholesky factorization"], loc=2)
     plt.ylabel("Execution time (s)")
     plt.xlabel("size")
     plt.show()
@@ -99,10 +192,16 @@ def printTest(test_func):
     print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
     print(("" if test_func() else "un") + "expected behaviour", flush=True)
 
-printTest(test_cholesky)
-print("Testing the precision of my custom Incomplete Cholesky Factorization")
-testIncompleteCholeskyPrecision()
-print("Comparing the execution times of my custom Cholesky Factorizations")
-compareCompleteVSIncomplete()
-print("Comparing the execution times of my custom Cholkesy Factorization and Numpy's")
-compareCholeskyCustomVSNumpy()
\ No newline at end of file
+if __name__ == "__main__":
+    printTest(test_cholesky)
+    printTest(test_blockedCholesky)
+    printTest(test_outOfCoreCholesky)
+    printTest(test_sparseIncompleteCholesky)
+    printTest(test_backends)
+    printTest(test_numbaKernel)
+    print("Testing the precision of my custom Incomplete Cholesky Factorization")
+    testIncompleteCholeskyPrecision()
+    print("Comparing the execution times of my custom Cholesky Factorizations")
+    compareCompleteVSIncomplete()
+    print("Comparing the execution times of my custom Cholkesy Factorization and Numpy's")
+    compareCholeskyCustomVSNumpy()
@@ -0,0 +1,165 @@
+# author : Etienne THIERY
+
+import numpy
+import concurrent.futures
+import tracemalloc
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import gui, heatEquation
+
+def test_temperaturePlot():
+    ''' Updating the plot neither leaks memory nor slows down'''
+    plot = gui.TemperaturePlot()
+    FigureCanvasAgg(plot.fig)
+    sols = [numpy.random.rand(size, size) for size in (20, 50, 20, 100)]
+    for sol in sols:
+        plot.update(sol)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    times = []
+    for i in range(100):
+        if i % 10 == 0:
+            print(".", end="", flush=True)
+        plot.update(sols[i % len(sols)])
+        times.append(plot.updateTime)
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return growth < 2**20 and numpy.median(times) < 0.1 and max(times) < 1
+
+def test_renderCells():
+    palette = numpy.array([[0, 0, 132], [0, 0, 255], [218, 0, 0]])
+    for zoom in (1, 3, 10):
+        print(".", end="", flush=True)
+        cells = numpy.random.randint(0, 3, (7, 5))
+        data = gui.renderCells(cells, palette, zoom)
+        header = ("P6 %d %d 255\n" % (5*zoom, 7*zoom)).encode()
+        if not data.startswith(header):
+            return False
+        pixels = numpy.frombuffer(data[len(header):], dtype=numpy.uint8).reshape((7*zoom, 5*zoom, 3))
+        # the center of each cell has the color of its value
+        centers = pixels[zoom//2::zoom, zoom//2::zoom]
+        if not numpy.array_equal(centers, palette[cells]):
+            return False
+        if zoom >= 4 and pixels[0].any():
+            return False
+    return True
+
+class StubFrame:
+    ''' Replaces the Tk frame, running the callbacks of after on demand'''
+
+    def __init__(self):
+        self.text, self.callbacks = None, []
+
+    def config(self, text):
+        self.text = text
+
+    def after(self, delay, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def runCallbacks(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback, args in callbacks:
+            callback(*args)
+
+class StubExecutor:
+    ''' Replaces the worker thread, running the submitted tasks on demand'''
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, function, *args):
+        future = concurrent.futures.Future()
+        self.tasks.append((future, function, args))
+        return future
+
+    def run(self):
+        tasks, self.tasks = self.tasks, []
+        for future, function, args in tasks:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args))
+                except Exception as error:
+                    future.set_exception(error)
+
+class StubMain:
+    def __init__(self, heatFlux):
+        self.input = heatFlux
+
+def stubSolutionFrame():
+    ''' Returns a SolutionFrame without Tk, whose displayed solutions are
+    appended to its shown list'''
+    frame = gui.SolutionFrame.__new__(gui.SolutionFrame)
+    frame.frame, frame.executor = StubFrame(), StubExecutor()
+    frame.pending, frame.requestId, frame.solver = None, 0, None
+    frame.preview, frame.shownPreview = None, None
+    frame.shown = []
+    frame.showSolution = frame.shown.append
+    return frame
+
+def test_supersededRequests():
+    ''' Only the solution of the last request is displayed, and an error of
+    the worker is displayed in the title'''
+    frame = stubSolutionFrame()
+    first, second = numpy.random.randint(0, 10, (2, 12, 12))
+    frame.updatePlot(StubMain(first))
+    stale = frame.pending
+    frame.updatePlot(StubMain(second))
+    # the first request had not started, and is cancelled
+    if not stale.cancelled():
+        return False
+    frame.executor.run()
+    frame.frame.runCallbacks()
+    expected = heatEquation.solveHeatEquation(second.astype(float), 0.01, 0.025)
+    if len(frame.shown) != 1 or not numpy.allclose(frame.shown[0], expected.transpose()):
+        return False
+    if frame.frame.text != 'Temperature map' or frame.pending is not None:
+        return False
+
+    def failingSolve(heatFlux, requestId):
+        raise ValueError('no solution')
+    frame.solve = failingSolve
+    frame.updatePlot(StubMain(first))
+    frame.executor.run()
+    frame.frame.runCallbacks()
+    return (len(frame.shown) == 1 and frame.pending is None
+            and 'no solution' in frame.frame.text and frame.frame.callbacks == [])
+
+def test_progressiveSolve():
+    ''' Large grids are solved coarse to fine, without Tk, and then updated
+    incrementally when a few cells change'''
+    frame = stubSolutionFrame()
+    frame.requestId = 1
+    heatFlux = numpy.random.randint(0, 10, (frame.progressiveSize+10,)*2)
+    sol = frame.solve(heatFlux, 1)
+    if not numpy.allclose(sol, heatEquation.solveHeatEquation(heatFlux.astype(float), 0.01, 0.025)):
+        return False
+    if frame.preview[0] != 1 or frame.preview[1] is not sol:
+        return False
+    # the incremental solver is ready without any factorization, and
+    # nothing is left in the worker thread
+    if not isinstance(frame.solver.factorization, gui.hE.DSTSolver):
+        return False
+    if frame.executor.tasks:
+        return False
+    heatFlux[3, 5] += 7
+    frame.requestId = 2
+    sol = frame.solve(heatFlux, 2)
+    if frame.preview[0] != 1 or frame.solver is None:
+        return False
+    if not numpy.allclose(sol, heatEquation.solveHeatEquation(heatFlux.astype(float), 0.01, 0.025)):
+        return False
+    # many changes are solved progressively again, and a solve superseded
+    # by a newer request stops early
+    heatFlux = numpy.random.randint(0, 10, heatFlux.shape)
+    frame.requestId = 4
+    return frame.solve(heatFlux, 3) is None and frame.solver is None
+
+def printTest(test_func):
+    print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
+    print(("" if test_func() else "un") + "expected behaviour", flush=True)
+
+if __name__ == "__main__":
+    printTest(test_renderCells)
+    printTest(test_temperaturePlot)
+    printTest(test_supersededRequests)
+    printTest(test_progressiveSolve)
@@ -0,0 +1,325 @@
+# author : Etienne THIERY
+
+import numpy, random
+import scipy.linalg
+import subprocess, sys, os
+import threading, time
+import timeit
+import cholesky, heatEquation
+import supernodal
+
+def referenceSolution(heatFlux, h, conductivity):
+    ''' The original dense Cholesky solve, used as a reference'''
+    n = heatFlux.shape[0]
+    b = heatEquation.matToVect(heatFlux)*h*h/conductivity
+    T = numpy.linalg.cholesky(-heatEquation.heatEquationMatrix(n))
+    y = scipy.linalg.solve_triangular(T, b, lower=True)
+    x = scipy.linalg.solve_triangular(-T.transpose(), y)
+    return heatEquation.vectToMat(x)
+
+def randomHeatFlux(size):
+    return numpy.random.randint(0, 10, (size, size)).astype(float)
+
+def test_sparseHeatEquationMatrix():
+    for size in range(1, 30):
+        print(".", end="", flush=True)
+        dense = heatEquation.heatEquationMatrix(size)
+        if not numpy.array_equal(heatEquation.sparseHeatEquationMatrix(size).toarray(), dense):
+            return False
+    return True
+
+def test_bandedHeatEquationMatrix():
+    for size in range(1, 30):
+        print(".", end="", flush=True)
+        dense = heatEquation.heatEquationMatrix(size)
+        ab = heatEquation.bandedHeatEquationMatrix(size)
+        for i in range(size+1):
+            if not numpy.array_equal(ab[i, :size*size-i], numpy.diag(dense, -i)):
+                return False
+    return True
+
+def test_solveHeatEquation():
+    for i in range(10):
+        print(".", end="", flush=True)
+        size = random.randint(5, 30)
+        heatFlux = randomHeatFlux(size)
+        reference = referenceSolution(heatFlux, 0.01, 0.025)
+        for method in heatEquation.methods:
+            sol = heatEquation.solveHeatEquation(heatFlux, 0.01, 0.025, method)
+            if not numpy.allclose(sol, reference):
+                return False
+    return True
+
+def test_denseBackends():
+    heatFlux = randomHeatFlux(8)
+    reference = referenceSolution(heatFlux, 0.01, 0.025)
+    for backend in cholesky.listBackends():
+        print(".", end="", flush=True)
+        sol = heatEquation.solveHeatEquation(heatFlux, 0.01, 0.025, 'dense:' + backend)
+        if not numpy.allclose(sol, reference):
+            return False
+    try:
+        heatEquation.solveHeatEquation(heatFlux, 0.01, 0.025, 'dense:unknown')
+    except ValueError:
+        return True
+    return False
+
+def test_nestedDissection():
+    for size in range(1, 40):
+        print(".", end="", flush=True)
+        supernodes, parents = supernodal.nestedDissection(size, 16)
+        if sorted(numpy.concatenate(supernodes)) != list(range(size*size)):
+            return False
+        # supernodes are eliminated after their children
+        if any(parent != -1 and parent <= s for s, parent in enumerate(parents)):
+            return False
+    # on large grids, the factor is much sparser than the band
+    factor = heatEquation.NestedDissectionCholesky(100).factor
+    return factor.nnz < 100**3/1.5
+
+def test_factorizationCache():
+    cache = heatEquation.FactorizationCache()
+    heatFlux = randomHeatFlux(20)
+    print(".", end="", flush=True)
+    first = heatEquation.solveHeatEquation(heatFlux, 0.01, 0.025, 'banded', cache)
+    factorization = cache.get(20, 'banded')
+    # other h and conductivity values are served by the same factorization
+    second = heatEquation.solveHeatEquation(heatFlux, 0.02, 0.1, 'banded', cache)
+    if len(cache.entries) != 1 or cache.get(20, 'banded') is not factorization:
+        return False
+    if not numpy.allclose(second, first*0.02*0.02/0.1*0.025/(0.01*0.01)):
+        return False
+
+    print(".", end="", flush=True)
+    # with a budget of one factorization, the least recently used is evicted
+    cache.resize(factorization.nbytes)
+    cache.get(10, 'banded')
+    cache.get(20, 'banded')
+    if list(cache.entries) != [(20, 'banded')] or cache.nbytes != factorization.nbytes:
+        return False
+
+    print(".", end="", flush=True)
+    # a factorization larger than the budget is not kept
+    cache.resize(factorization.nbytes - 1)
+    if cache.entries or cache.nbytes != 0:
+        return False
+    if cache.get(20, 'banded').nbytes != factorization.nbytes:
+        return False
+    return not cache.entries and cache.nbytes == 0
+
+def test_factorizationCacheThreads():
+    ''' A slow factorization blocks neither hits on other entries, nor is
+    computed twice by concurrent misses'''
+    cache = heatEquation.FactorizationCache()
+    cache.get(5, 'banded')
+    calls = []
+    factorize = heatEquation.factorize
+    def slowFactorize(n, method):
+        calls.append((n, method))
+        time.sleep(0.5)
+        return factorize(n, method)
+    heatEquation.factorize = slowFactorize
+    try:
+        threads = [threading.Thread(target=cache.get, args=(10, 'banded')) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        print(".", end="", flush=True)
+        start = time.perf_counter()
+        cache.get(5, 'banded')
+        hitTime = time.perf_counter() - start
+        for thread in threads:
+            thread.join()
+    finally:
+        heatEquation.factorize = factorize
+    return hitTime < 0.1 and calls == [(10, 'banded')] and (10, 'banded') in cache.entries
+
+def test_solveHeatEquationBatch():
+    for i in range(5):
+        print(".", end="", flush=True)
+        size = random.randint(5, 30)
+        k = random.randint(1, 10)
+        heatFluxes = numpy.array([randomHeatFlux(size) for j in range(k)])
+        h = numpy.random.uniform(0.01, 0.1, k)
+        for method in heatEquation.factorizations:
+            sols = heatEquation.solveHeatEquationBatch(heatFluxes, h, 0.025, method)
+            for j in range(k):
+                sol = heatEquation.solveHeatEquation(heatFluxes[j], h[j], 0.025, method)
+                if not numpy.allclose(sols[j], sol):
+                    return False
+    return True
+
+def test_solveHeatEquationPCG():
+    for size in [1] + [random.randint(5, 50) for i in range(5)]:
+        print(".", end="", flush=True)
+        heatFlux = randomHeatFlux(size)
+        reference = referenceSolution(heatFlux, 0.01, 0.025)
+        sol, unpreconditioned = heatEquation.solveHeatEquationPCG(heatFlux, 0.01, 0.025,
+                                                                 tol=1e-12, preconditioner=None)
+        if not numpy.allclose(sol, reference):
+            return False
+        for preconditioner in heatEquation.preconditioners:
+            sol, history = heatEquation.solveHeatEquationPCG(heatFlux, 0.01, 0.025, tol=1e-12,
+                                                            preconditioner=preconditioner)
+            if not (numpy.allclose(sol, reference) and history[-1] <= 1e-12):
+                return False
+            # the preconditioner reduces the number of iterations, a single
+            # cell being solved in one iteration anyway
+            if size > 1 and len(history) >= len(unpreconditioned):
+                return False
+        # starting from the solution, there is nothing left to do
+        sol, warm = heatEquation.solveHeatEquationPCG(heatFlux, 0.01, 0.025, x0=reference)
+        if len(warm) != 1:
+            return False
+    return True
+
+def test_solveHeatEquationMultigrid():
+    for size in [1, 2, 15, 16, 31, 40]:
+        print(".", end="", flush=True)
+        heatFlux = randomHeatFlux(size)
+        reference = referenceSolution(heatFlux, 0.01, 0.025)
+        sol, history = heatEquation.solveHeatEquationMultigrid(heatFlux, 0.01, 0.025, tol=1e-12)
+        if not (numpy.allclose(sol, reference) and history[-1] <= 1e-12):
+            return False
+        # the number of cycles does not grow with the size of the grid
+        if len(history) > 15:
+            return False
+        sol, warm = heatEquation.solveHeatEquationMultigrid(heatFlux, 0.01, 0.025, x0=reference)
+        if len(warm) != 1:
+            return False
+    return True
+
+def test_solveHeatEquationDST():
+    for size in range(1, 40):
+        print(".", end="", flush=True)
+        heatFlux = randomHeatFlux(size)
+        sol = heatEquation.solveHeatEquationDST(heatFlux, 0.01, 0.025)
+        if not numpy.allclose(sol, referenceSolution(heatFlux, 0.01, 0.025)):
+            return False
+    return True
+
+def test_solveHeatEquationProgressive():
+    for size in [1, 20, 64, 101]:
+        print(".", end="", flush=True)
+        heatFlux = randomHeatFlux(size)
+        sols = list(heatEquation.solveHeatEquationProgressive(heatFlux, 0.01, 0.025, 7))
+        sizes = [sol.shape[0] for sol in sols]
+        if sizes[-1] != size or sizes != sorted(sizes) or (size > 20 and len(sols) < 3):
+            return False
+        if not numpy.allclose(sols[-1], referenceSolution(heatFlux, 0.01, 0.025)):
+            return False
+    # the coarse solutions approximate the fine one
+    heatFlux = numpy.ones((63, 63))
+    coarse, sol = list(heatEquation.solveHeatEquationProgressive(heatFlux, 0.01, 0.025, 31))
+    return numpy.abs(sol[1::2, 1::2] - coarse).max() < 0.01*numpy.abs(sol).max()
+
+def test_solveHeatEquationMixed():
+    for preconditioner in ['banded32', 'dense32']:
+        for size in [1, 7, 20, 30]:
+            print(".", end="", flush=True)
+            heatFlux = randomHeatFlux(size)
+            sol, history = heatEquation.solveHeatEquationMixed(heatFlux, 0.01, 0.025,
+                                                               preconditioner=preconditioner)
+            if not numpy.allclose(sol, referenceSolution(heatFlux, 0.01, 0.025), rtol=1e-10):
+                return False
+            # the single precision solve alone is not accurate enough
+            if size > 1 and (history[0] < 1e-10 or len(history) < 2 or len(history) > 6):
+                return False
+    # the factor takes half the memory, and the matrix kept for the
+    # residuals is counted too
+    single, double = heatEquation.factorize(30, 'banded32'), heatEquation.factorize(30, 'banded')
+    matrixBytes = heatEquation.sparseBytes(single.A)
+    if single.nbytes != double.nbytes//2 + matrixBytes:
+        return False
+    single = heatEquation.factorize(20, 'dense32')
+    return (single.T.dtype == numpy.float32
+            and single.nbytes == single.T.nbytes + heatEquation.sparseBytes(single.A))
+
+def test_incrementalSolver():
+    size = 20
+    heatFlux = randomHeatFlux(size)
+    solver = heatEquation.IncrementalSolver(heatFlux, 0.01, 0.025, maxBytes=8*size*size*5)
+    for i in range(10):
+        print(".", end="", flush=True)
+        # a few cells, often the same ones, are edited
+        for j in range(random.randint(1, 3)):
+            row, col = random.randint(0, 4), random.randint(0, size-1)
+            heatFlux[row, col] = random.randint(0, 9)
+        sol = solver.update(heatFlux)
+        if not numpy.allclose(sol, referenceSolution(heatFlux, 0.01, 0.025)):
+            return False
+        if len(solver.greens) > 5:
+            return False
+    # many changes are solved from scratch
+    heatFlux = randomHeatFlux(size)
+    if not numpy.allclose(solver.update(heatFlux), referenceSolution(heatFlux, 0.01, 0.025)):
+        return False
+    # Green's functions computed with the DST, from a known solution
+    solver = heatEquation.IncrementalSolver(heatFlux, 0.01, 0.025, method='dst',
+                                            solution=referenceSolution(heatFlux, 0.01, 0.025))
+    heatFlux[2, 7] += 5
+    heatFlux[size-1, 0] = 3
+    return numpy.allclose(solver.update(heatFlux), referenceSolution(heatFlux, 0.01, 0.025))
+
+def test_lightImport():
+    ''' Solving neither needs matplotlib nor Tk, and numba is only imported
+    by the dense:numba method'''
+    code = ("import sys, heatEquation\n"
+            "modules = ('matplotlib', 'tkinter', 'trunk.matgen', 'numba')\n"
+            "sys.exit(any(m in sys.modules for m in modules))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable, '-c', code], env=env).returncode == 0
+
+def wrapper(func, *args, **kwargs):
+    def wrapped():
+        return func(*args, **kwargs)
+    return wrapped
+
+def compareSolveMethods():
+    ''' Times every factorization method in function of the grid size, and
+    prints the sizes at which the fastest method changes'''
+    import matplotlib.pyplot as plt
+    sizes = range(2, 61, 2)
+    nbValuesForAverage = 3
+    times = {method: [] for method in heatEquation.methods}
+    fastest = None
+
+    for size in sizes:
+        heatFlux = randomHeatFlux(size)
+        for method in heatEquation.methods:
+            wrapped = wrapper(heatEquation.solveHeatEquation, heatFlux, 0.01, 0.025, method)
+            times[method].append(min(timeit.repeat(wrapped, number=1, repeat=nbValuesForAverage)))
+        best = min(times, key=lambda method: times[method][-1])
+        if best != fastest:
+            print("From size", size, "the fastest method is", best)
+            fastest = best
+
+    for method in heatEquation.methods:
+        plt.plot(sizes, times[method], marker='o')
+    plt.title("Execution time of solveHeatEquation in function of the grid size\n")
+    plt.legend(list(heatEquation.methods), loc=2)
+    plt.ylabel("Execution time (s)")
+    plt.xlabel("size")
+    plt.show()
+
+def printTest(test_func):
+    print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
+    print(("" if test_func() else "un") + "expected behaviour", flush=True)
+
+if __name__ == "__main__":
+    printTest(test_sparseHeatEquationMatrix)
+    printTest(test_bandedHeatEquationMatrix)
+    printTest(test_solveHeatEquation)
+    printTest(test_denseBackends)
+    printTest(test_nestedDissection)
+    printTest(test_factorizationCache)
+    printTest(test_factorizationCacheThreads)
+    printTest(test_solveHeatEquationBatch)
+    printTest(test_incrementalSolver)
+    printTest(test_solveHeatEquationPCG)
+    printTest(test_solveHeatEquationMultigrid)
+    printTest(test_solveHeatEquationDST)
+    printTest(test_solveHeatEquationMixed)
+    printTest(test_solveHeatEquationProgressive)
+    printTest(test_lightImport)
+    print("Comparing the execution times of the solve methods")
+    compareSolveMethods()
@@ -0,0 +1,79 @@
+# author : Etienne THIERY
+
+import numpy
+import cholesky, heatEquation, matgen
+# the module used by heatEquation and cholesky, which hold the hooks
+import trunk.instrumentation as instrumentation
+
+def test_disabled():
+    stage = instrumentation.stage('disabled')
+    with stage as record:
+        record['size'] = 1
+    return not instrumentation.enabled() and stage is instrumentation.nullStage
+
+def test_nestedStages():
+    with instrumentation.collect() as stats:
+        with instrumentation.stage('outer', n=1):
+            a = numpy.ones(2**20)
+            with instrumentation.stage('inner') as record:
+                b = numpy.ones(2**21)
+                record['iterations'] = 3
+                del b
+            del a
+    if instrumentation.enabled():
+        return False
+    inner, outer = stats.records
+    # the inner stage ends first, and its peak is included in the outer one
+    return (inner['stage'] == 'inner' and inner['iterations'] == 3
+            and outer['n'] == 1 and inner['peakBytes'] >= 2**24
+            and outer['peakBytes'] >= 2**23 + 2**24
+            and outer['time'] >= inner['time'])
+
+def test_heatEquationStages():
+    heatFlux = numpy.random.randint(0, 10, (20, 20)).astype(float)
+    with instrumentation.collect() as stats:
+        heatEquation.solveHeatEquation(heatFlux, 0.01, 0.025, 'banded', cache=None)
+        heatEquation.solveHeatEquationPCG(heatFlux, 0.01, 0.025, cache=None)
+    summary = stats.summary()
+    for stage in ['assembly', 'factorization', 'solve', 'pcg']:
+        if summary.get(stage, {}).get('calls', 0) == 0:
+            return False
+    factorization = stats.select('factorization')[0]
+    pcg = stats.select('pcg')[0]
+    return (factorization['method'] == 'banded' and factorization['size'] == 400
+            and factorization['nbytes'] > 0 and pcg['iterations'] > 0
+            and pcg['residual'] <= 1e-10)
+
+def test_zeroHeatFlux():
+    ''' Solves returning early are recorded too'''
+    heatFlux = numpy.zeros((10, 10))
+    with instrumentation.collect() as stats:
+        for method in heatEquation.methods:
+            heatEquation.solveHeatEquation(heatFlux, 0.01, 0.025, method)
+    summary = stats.summary()
+    return all(summary.get(stage, {}).get('calls') == 1
+               for stage in ['pcg', 'multigrid', 'dst', 'refinement'])
+
+def test_choleskyStages():
+    M = matgen.symmetricPositiveDefinite(50)
+    records = []
+    instrumentation.addHook(records.append)
+    try:
+        cholesky.completeCholesky(M)
+        cholesky.blockedCholesky(M, 16)
+    finally:
+        instrumentation.removeHook(records.append)
+    # the diagonal tiles of blockedCholesky are factorized by completeCholesky
+    return [(r['stage'], r['size']) for r in records] == [('completeCholesky', 50)] \
+        + [('completeCholesky', 16)]*3 + [('completeCholesky', 2), ('blockedCholesky', 50)]
+
+def printTest(test_func):
+    print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
+    print(("" if test_func() else "un") + "expected behaviour", flush=True)
+
+if __name__ == "__main__":
+    printTest(test_disabled)
+    printTest(test_nestedStages)
+    printTest(test_heatEquationStages)
+    printTest(test_zeroHeatFlux)
+    printTest(test_choleskyStages)
@@ -3,6 +3,7 @@
 from matgen import *
 import random
 import numpy
+import os, tempfile
 
 def test_symmetricPositiveDefinite():
     for i in range(10):
@@ -23,15 +24,41 @@ def test_symmetricSparsePositiveDefinite():
         M = symmetricSparsePositiveDefinite(size, nbZeros, maxVal)
         if not (isSymmetric(M) and isDefinitePositive(M) and abs(numberOfZeros(M)-nbZeros) <= 1):
             return False
+    # the number of zeros may be a float, as given by numpy.linspace
+    for nbZeros in numpy.linspace(0, 50*49, 5):
+        M = symmetricSparsePositiveDefinite(50, nbZeros)
+        if not (isSymmetric(M) and abs(numberOfZeros(M)-int(nbZeros)) <= 1):
+            return False
+    return True
+
+def test_symmetricPositiveDefiniteFile():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "M.npy")
+    for i in range(5):
+        print(".", end="", flush=True)
+        size = random.randint(400, 500)
+        maxVal = random.randint(0, 1000)
+        symmetricPositiveDefiniteFile(path, size, maxVal, random.randint(1, 200))
+        M = numpy.load(path)
+        if not (isSymmetric(M) and isDefinitePositive(M)):
+            return False
+    os.remove(path)
+    os.rmdir(directory)
+    return True
+
+def test_sparseOutput():
+    for i in range(10):
+        print(".", end="", flush=True)
+        size = random.randint(5000, 10000)
+        maxVal = random.randint(0, 1000)
+        nbZeros = size*(size-1) - random.randint(0, 20*size)
+        M = symmetricSparsePositiveDefinite(size, nbZeros, maxVal, sparse=True)
+        if not (isSymmetric(M) and isDefinitePositive(M) and abs(size*size-M.nnz-nbZeros) <= 1):
+            return False
     return True
 
 def numberOfZeros(M):
-    count = 0
-    for line in M:
-            for coeff in line:
-                if coeff == 0:
-                    count+=1
-    return count
+    return M.size - numpy.count_nonzero(M)
 
 def printTest(test_func):
     print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
@@ -39,3 +66,5 @@ def printTest(test_func):
 
 printTest(test_symmetricPositiveDefinite)
 printTest(test_symmetricSparsePositiveDefinite)
+printTest(test_symmetricPositiveDefiniteFile)
+printTest(test_sparseOutput)
@@ -0,0 +1,53 @@
+# author : Etienne THIERY
+
+import numpy, random
+import os, tempfile
+import heatEquation, transient
+
+def randomHeatFlux(size):
+    return numpy.random.randint(0, 10, (size, size)).astype(float)
+
+def test_heatEquationFrames():
+    h, conductivity, diffusivity, dt = 0.01, 0.025, 2e-5, 0.5
+    for scheme, theta in transient.schemes.items():
+        print(".", end="", flush=True)
+        size = random.randint(5, 20)
+        heatFlux = randomHeatFlux(size)
+        # dense reference of the same scheme
+        r = diffusivity*dt/(h*h)
+        L = heatEquation.heatEquationMatrix(size)
+        I = numpy.eye(size*size)
+        b = r*heatEquation.matToVect(heatFlux)*h*h/conductivity
+        T = numpy.random.rand(size*size)
+        frames = transient.heatEquationFrames(heatFlux, h, conductivity, diffusivity, dt,
+                                              10, heatEquation.vectToMat(T), scheme)
+        for frame in frames:
+            if not numpy.allclose(frame, heatEquation.vectToMat(T)):
+                return False
+            T = numpy.linalg.solve(I - theta*r*L, numpy.dot(I + (1-theta)*r*L, T) - b)
+        # the stationary state is the solution of the stationary equation
+        frames = list(transient.heatEquationFrames(heatFlux, h, conductivity, diffusivity,
+                                                   1000., 20, scheme='euler'))
+        if not numpy.allclose(frames[-1], heatEquation.solveHeatEquation(heatFlux, h, conductivity)):
+            return False
+    return True
+
+def test_saveHeatEquationFrames():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "frames.npy")
+    heatFlux = randomHeatFlux(15)
+    print(".", end="", flush=True)
+    transient.saveHeatEquationFrames(path, heatFlux, 0.01, 0.025, 2e-5, 0.5, 20)
+    frames = numpy.load(path)
+    expected = list(transient.heatEquationFrames(heatFlux, 0.01, 0.025, 2e-5, 0.5, 20))
+    os.remove(path)
+    os.rmdir(directory)
+    return frames.shape == (21, 15, 15) and numpy.allclose(frames, expected)
+
+def printTest(test_func):
+    print("Testing " + test_func.__name__[5:] + " : ", end="", flush=True)
+    print(("" if test_func() else "un") + "expected behaviour", flush=True)
+
+if __name__ == "__main__":
+    printTest(test_heatEquationFrames)
+    printTest(test_saveHeatEquationFrames)
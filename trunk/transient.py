@@ -0,0 +1,53 @@
+# Time dependent heat equation on the same grid as heatEquation :
+#   dT/dt = diffusivity * (heatEquationMatrix(n) T / h^2 - heatFlux / conductivity)
+# whose stationary state is the solution of heatEquation.solveHeatEquation.
+# Temperature frames use the same layout as the solutions of
+# heatEquation.solveHeatEquation.
+
+import numpy as np
+import scipy.sparse as sp
+import trunk.heatEquation as hE
+import trunk.supernodal as supernodal
+
+schemes = {'euler': 1., 'crank-nicolson': 0.5}
+
+def heatEquationFrames(heatFlux, h, conductivity, diffusivity, dt, nbSteps,
+                       initial=None, scheme='crank-nicolson'):
+    ''' Generator of the temperature frames of the time dependent heat
+    equation, from the initial frame (zero by default) to the frame after
+    nbSteps time steps of length dt. scheme is either 'euler' for implicit
+    Euler or 'crank-nicolson'.
+    The matrix of the implicit part is factorized once, each frame being
+    computed lazily, when it is requested, with a single solve'''
+    if scheme not in schemes:
+        raise ValueError("unknown scheme '%s'" % scheme)
+    theta = schemes[scheme]
+    n = heatFlux.shape[0]
+    r = diffusivity*dt/(h*h)
+    L = hE.sparseHeatEquationMatrix(n)
+    b = r*hE.matToVect(heatFlux)*h*h/conductivity
+    # (I - theta r L) T' = (I + (1-theta) r L) T - r b
+    supernodes, parents = supernodal.nestedDissection(n)
+    factor = supernodal.SupernodalCholesky(sp.identity(n*n) - theta*r*L,
+                                           supernodes, parents)
+    explicit = sp.identity(n*n) + (1-theta)*r*L
+    T = np.zeros(n*n) if initial is None else np.array(initial, dtype=float).ravel()
+    yield hE.vectToMat(T.copy())
+    for step in range(nbSteps):
+        T = factor.solve(explicit.dot(T) - b)
+        yield hE.vectToMat(T.copy())
+
+def saveHeatEquationFrames(path, heatFlux, h, conductivity, diffusivity, dt,
+                           nbSteps, initial=None, scheme='crank-nicolson'):
+    ''' Writes the frames of heatEquationFrames to the .npy file path as a
+    (nbSteps+1) x n x n array, one frame at a time, so that the history
+    does not have to fit in memory. Returns it as a numpy.memmap'''
+    n = heatFlux.shape[0]
+    frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64,
+                                       shape=(nbSteps+1, n, n))
+    for step, frame in enumerate(heatEquationFrames(heatFlux, h, conductivity,
+                                                    diffusivity, dt, nbSteps,
+                                                    initial, scheme)):
+        frames[step] = frame
+    frames.flush()
+    return frames